@@ -0,0 +1,282 @@
+import argparse
+import gzip
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from multiprocessing import get_context
+
+from configurations import Configurations
+from encoder import Encoder
+from generator import fixed_polyominoes
+from placement_encoder import PlacementEncoder
+from solvers import Solver, make_solver
+
+# (width, height, k, unique) configurations measured by default.
+MATRIX = [(4, 4, 4, False), (5, 4, 4, True), (5, 5, 5, False), (6, 5, 5, False),
+          (8, 5, 5, False), (6, 6, 4, False), (10, 6, 5, True)]
+QUICK_MATRIX = MATRIX[:3]
+PHASES = ("generate", "encode", "dimacs", "solve")
+# Options that must be the same to replay recorded answers.
+RECORD_KEYS = ("encoding", "solver", "max_models")
+# Modules that importing the core (main.py and everything it imports) must not load.
+LAZY_MODULES = ("matplotlib", "termcolor", "asyncio", "cProfile", "sqlite3")
+IMPORT_CHECK = f"""
+import sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(elapsed, *[m for m in {LAZY_MODULES!r} if m in sys.modules])
+"""
+
+
+def config_key(width: int, height: int, k: int, unique: bool) -> str:
+    return f"{width}x{height}_{k}{'_u' if unique else ''}"
+
+
+class ReplaySolver(Solver):
+    """ Returns recorded answers, in order, instead of solving. The enumeration loop is
+    deterministic, so replaying the answers of a recorded run repeats the same run. """
+
+    def __init__(self, encoder, answers, verbose=False):
+        super().__init__(encoder, verbose)
+        self.answers = iter(answers)
+
+    def solve(self, assumptions=()):
+        model = next(self.answers, ())
+        if model == ():
+            raise RuntimeError("The recorded answers ran out before the end of the run.")
+        return (0, None) if model is None else (1, model)
+
+
+class RecordingSolver(Solver):
+    """ Solves with another solver, recording its answers for a ReplaySolver. """
+
+    def __init__(self, solver: Solver):
+        super().__init__(solver.encoder, solver.verbose)
+        self.solver = solver
+        self.answers = []
+
+    def solve(self, assumptions=()):
+        result, model = self.solver.solve(assumptions)
+        self.answers.append(list(model) if result == 1 else None)
+        return result, model
+
+    def close(self):
+        self.solver.close()
+
+
+def peak_rss_kb() -> int:
+    """ Peak resident memory of this process so far, in KiB. ru_maxrss survives the exec of a
+    spawned process (and so includes its parent's peak), so Linux' VmHWM is preferred. """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_benchmark(task):
+    """ Measures every phase of one configuration, in a fresh worker process. """
+    (width, height, k, unique), options = task
+    key = config_key(width, height, k, unique)
+    config = Configurations(width, height, k, unique, False, solver=options["solver"],
+                            encoding=options["encoding"])
+    result = {"config": key, "phases": {}, "peak_rss_kb": {}}
+
+    def phase(name, start):
+        result["phases"][name] = time.perf_counter() - start
+        result["peak_rss_kb"][name] = peak_rss_kb()
+
+    start = time.perf_counter()
+    polyominoes = set(fixed_polyominoes(k))
+    phase("generate", start)
+    result["num_polyominoes"] = len(polyominoes)
+
+    start = time.perf_counter()
+    if config.encoding == "placements":
+        encoder = PlacementEncoder(config, polyominoes)
+    else:
+        encoder = Encoder(config, polyominoes)
+    encoder.encode()
+    phase("encode", start)
+    result["num_vars"] = encoder.num_vars
+    result["num_clauses"] = len(encoder.constraints)
+
+    start = time.perf_counter()
+    stream = io.BytesIO()
+    encoder.write_dimacs(stream)
+    phase("dimacs", start)
+    result["dimacs_bytes"] = stream.tell()
+    del stream
+
+    start = time.perf_counter()
+    if options["answers"] is not None:
+        solver = ReplaySolver(encoder, options["answers"])
+    else:
+        solver = make_solver(config.solver, encoder, verbose=False)
+        if options["record"]:
+            solver = RecordingSolver(solver)
+    num_models = 0
+    result_code, model = solver.solve()
+    while result_code == 1 and num_models < options["max_models"]:
+        num_models += 1
+        encoder.get_solution(model)
+        encoder.block_model(model)
+        if num_models < options["max_models"]:
+            result_code, model = solver.solve()
+    solver.close()
+    phase("solve", start)
+    result["num_models"] = num_models
+    if isinstance(solver, RecordingSolver):
+        result["answers"] = solver.answers
+    return result
+
+
+def run_matrix(matrix, options):
+    """ Runs each configuration in its own fresh (spawned) process, so that peak memory is per
+    configuration. Each one only gets its own recorded answers, if any. """
+    tasks = []
+    for entry in matrix:
+        entry_options = dict(options)
+        if options["answers"] is not None:
+            if config_key(*entry) not in options["answers"]:
+                raise ValueError(f"No recorded answers for {config_key(*entry)}.")
+            entry_options["answers"] = options["answers"][config_key(*entry)]
+        tasks.append((entry, entry_options))
+    with get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(run_benchmark, tasks):
+            print(f"# {result['config']}: " + ", ".join(
+                f"{name} {result['phases'][name]:.3f}s" for name in PHASES) +
+                f"; {result['num_vars']} vars, {result['num_clauses']} clauses, "
+                f"{result['num_models']} models, peak {result['peak_rss_kb']['solve']} KiB.",
+                file=sys.stderr)
+            yield result
+
+
+def check_import_time(budget: float, repeats: int = 5) -> bool:
+    """ Checks that importing main.py takes at most budget seconds (best of repeats fresh
+    interpreters) and does not import any of LAZY_MODULES. """
+    import subprocess
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", IMPORT_CHECK], check=True,
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        times.append(float(output[0]))
+        loaded = output[1:]
+    best = min(times)
+    print(f"# importing main.py: best {best:.3f}s of {repeats}, budget {budget:.3f}s.",
+          file=sys.stderr)
+    if loaded:
+        print(f"# IMPORT REGRESSION: importing main.py loads {', '.join(loaded)}.",
+              file=sys.stderr)
+    if best > budget:
+        print(f"# IMPORT REGRESSION: {best:.3f}s is over the budget.", file=sys.stderr)
+    return best <= budget and not loaded
+
+
+def compare(results, baseline, threshold: float, min_time: float):
+    """ Returns the phases that got slower than the baseline by more than threshold (a ratio).
+    Phases that took less than min_time seconds in the baseline are too noisy to compare. """
+    old = {result["config"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        if result["config"] not in old:
+            continue
+        for name in PHASES:
+            before = old[result["config"]]["phases"][name]
+            after = result["phases"][name]
+            if before >= min_time and after > before * (1 + threshold):
+                regressions.append((result["config"], name, before, after))
+    return regressions
+
+
+def read_json(filename: str):
+    with (gzip.open if filename.endswith(".gz") else open)(filename, "rt") as f:
+        return json.load(f)
+
+
+def write_json(filename: str, data):
+    with (gzip.open if filename.endswith(".gz") else open)(filename, "wt") as f:
+        json.dump(data, f, indent=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times polyomino generation, encoding, DIMACS "
+                                                 "serialization and solving on a fixed matrix "
+                                                 "of configurations.")
+    parser.add_argument('--quick', action='store_true',
+                        help="Only run the smallest configurations.")
+    parser.add_argument('-e', '--encoding', choices=['cells', 'placements'], default='cells')
+    parser.add_argument('-s', '--solver', choices=['incremental', 'subprocess'],
+                        default='incremental')
+    parser.add_argument('--max-models', type=int, default=200,
+                        help="Stop the enumeration of each configuration after this many models.")
+    parser.add_argument('-o', '--output', default=None,
+                        help="Write the results as JSON to this file (default: stdout).")
+    parser.add_argument('--baseline', default=None,
+                        help="Compare with the results in this file and exit with status 1 if "
+                             "some phase got slower.")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Slowdown ratio flagged as a regression (default: 0.2, i.e. 20%%).")
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help="Phases faster than this (seconds) in the baseline are not compared.")
+    parser.add_argument('--import-budget', type=float, default=None, metavar='SECONDS',
+                        help="Only check that importing main.py takes at most this long and "
+                             "loads no drawing or other optional module; exit with status 1 "
+                             "otherwise.")
+    parser.add_argument('--record', default=None,
+                        help="Record the solver's answers to this file (.json or .json.gz).")
+    parser.add_argument('--replay', default=None,
+                        help="Replay the answers recorded in this file instead of solving, so "
+                             "that no solver is needed.")
+    args = parser.parse_args()
+    if args.import_budget is not None:
+        sys.exit(0 if check_import_time(args.import_budget) else 1)
+
+    answers = None
+    if args.replay is not None:
+        record = read_json(args.replay)
+        # The answers are only valid for the run that was recorded.
+        for key in RECORD_KEYS:
+            if record.get(key) != getattr(args, key):
+                parser.error(f"{args.replay} was recorded with {key}={record.get(key)}, "
+                             f"not {getattr(args, key)}.")
+        answers = record["answers"]
+    options = {"solver": args.solver, "encoding": args.encoding, "max_models": args.max_models,
+               "record": args.record is not None, "answers": answers}
+    results = list(run_matrix(QUICK_MATRIX if args.quick else MATRIX, options))
+    if args.record is not None:
+        write_json(args.record, {**{key: getattr(args, key) for key in RECORD_KEYS},
+                                 "answers": {result["config"]: result.pop("answers")
+                                             for result in results}})
+
+    report = {"python": platform.python_version(), "machine": platform.machine(),
+              "encoding": args.encoding, "solver": "replay" if answers else args.solver,
+              "max_models": args.max_models, "results": results}
+    if args.output is not None:
+        write_json(args.output, report)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+    if args.baseline is not None:
+        regressions = compare(results, read_json(args.baseline), args.threshold, args.min_time)
+        for config, name, before, after in regressions:
+            print(f"# REGRESSION {config} {name}: {before:.3f}s -> {after:.3f}s "
+                  f"({after / before - 1:+.0%}).", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"# No regressions over {args.threshold:.0%} against {args.baseline}.",
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from array import array
+
+import numpy as np
+
+from polyomino import Polyomino, shape_ids
+
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = os.environ.get("XOXO_CACHE_DIR",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "xoxo"))
+DEFAULT_CACHE_SIZE = 1 << 30
+
+
+def library_digest(polyominoes) -> str:
+    """ Identifies an (ordered) list of polyominoes, so that tables built on it are not mixed
+    with tables built on another order. """
+    coords = np.array([poly.coords() for poly in polyominoes], dtype="<i2")
+    return hashlib.blake2b(coords.tobytes(), digest_size=6).hexdigest()
+
+
+class Cache:
+    """ On-disk cache of polyomino libraries, placement tables and base CNFs.
+    Each entry is a directory of .npy arrays (loaded as memory maps) with a meta.json that holds
+    the cache version and scalar data. Reading an entry marks it as recently used; when the
+    cache grows above max_bytes, the least recently used entries are removed. """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str):
+        """ Returns (meta, {array name: memory-mapped array}) for entry name, or None. """
+        path = self._path(name)
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != CACHE_VERSION:
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        try:
+            arrays = {key: np.load(os.path.join(path, key + ".npy"), mmap_mode="r")
+                      for key in meta["arrays"]}
+            os.utime(os.path.join(path, "meta.json"))
+        except (OSError, ValueError):
+            # evicted by another process while loading it
+            return None
+        return meta, arrays
+
+    def put(self, name: str, arrays: dict, **meta):
+        """ Writes entry name. It is written to a temporary directory that is then renamed, so
+        that concurrent runs never see a partial entry. """
+        tmp_path = self._path(f".tmp-{name}-{os.getpid()}")
+        os.makedirs(tmp_path, exist_ok=True)
+        for key, values in arrays.items():
+            np.save(os.path.join(tmp_path, key + ".npy"), values)
+        meta.update(version=CACHE_VERSION, arrays=sorted(arrays), created=time.time())
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp_path, self._path(name))
+        except OSError:
+            # Another run stored the same entry first.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """ Removes least recently used entries until the cache fits in max_bytes. """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            if name.startswith(".tmp-") or not os.path.isdir(path):
+                continue
+            try:
+                last_used = os.path.getmtime(os.path.join(path, "meta.json"))
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+            except OSError:
+                continue
+            entries.append((last_used, size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def polyominoes(self, k: int, pieces: str, build):
+        """ Returns (sorted polyominoes of size k, their shape ids for the pieces mode), calling
+        build(k) only on a cache miss. """
+        name = f"library_k{k}_{pieces}"
+        entry = self.get(name)
+        if entry is not None:
+            _, arrays = entry
+            polyominoes = [Polyomino([tuple(c) for c in coords])
+                           for coords in arrays["coords"].tolist()]
+            return polyominoes, arrays["shape_ids"].tolist()
+        polyominoes = sorted(build(k))
+        ids = shape_ids(polyominoes, pieces)
+        self.put(name, {"coords": np.array([poly.coords() for poly in polyominoes], dtype="<i2"),
+                        "shape_ids": np.array(ids, dtype=np.int32)})
+        return polyominoes, ids
+
+    def placements(self, polyominoes, width: int, height: int, matrix_class):
+        """ Returns the placement matrix of the board, only building it with
+        matrix_class.build() on a cache miss. """
+        name = f"placements_{width}x{height}_k{polyominoes[0].k()}_{library_digest(polyominoes)}"
+        entry = self.get(name)
+        if entry is not None:
+            return matrix_class.from_arrays(width, height, entry[1])
+        matrix = matrix_class.build(polyominoes, width, height)
+        self.put(name, matrix.arrays())
+        return matrix
+
+    def encode(self, encoder, options) -> bool:
+        """ Loads the encoder's base CNF from the cache or encodes it and stores it.
+        options are the settings, besides the board and polyominoes, that change the CNF.
+        Returns whether the CNF came from the cache. """
+        key = hashlib.blake2b(repr((type(encoder).__name__, options)).encode(),
+                              digest_size=6).hexdigest()
+        name = f"cnf_{encoder.width}x{encoder.height}_k{encoder.k}_" \
+               f"{library_digest(encoder.polyominoes)}_{key}"
+        entry = self.get(name)
+        if entry is not None:
+            meta, arrays = entry
+            encoder.constraints.lits = array('i', arrays["lits"].astype(np.int32).tobytes())
+            encoder.constraints.offsets = array('q', arrays["offsets"].astype(np.int64).tobytes())
+            encoder.num_vars = meta["num_vars"]
+            encoder.cardinality_stats = meta["cardinality_stats"]
+            return True
+        encoder.encode()
+        self.put(name, {"lits": np.frombuffer(encoder.constraints.lits, dtype=np.int32),
+                        "offsets": np.frombuffer(encoder.constraints.offsets, dtype=np.int64)},
+                 num_vars=encoder.num_vars, cardinality_stats=encoder.cardinality_stats)
+        return False
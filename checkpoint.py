@@ -0,0 +1,105 @@
+import gzip
+import os
+import pickle
+import time
+from array import array
+from dataclasses import asdict
+
+import numpy as np
+
+from configurations import Configurations
+from solution import Solution
+
+# 2: polyominoes with the same ordering sum are ordered by their cells.
+# 3: finished cubes are saved as their placements instead of their index.
+CHECKPOINT_VERSION = 3
+
+# Configuration fields that must match for a checkpoint to be resumed.
+RESUME_KEYS = ("width", "height", "k", "unique", "pieces", "encoding", "backend",
+               "break_symmetries", "presolve")
+
+
+def default_checkpoint_file(config: Configurations) -> str:
+    return f"checkpoint_{config.width}x{config.height}_{config.k}" \
+           f"{'_u' if config.unique else ''}.ckpt"
+
+
+def solution_to_array(solution: Solution) -> array:
+    solution.check_solution()
+    return array('i', solution.grid.ravel().tolist())
+
+
+def solution_from_array(colors: array, width: int, height: int) -> Solution:
+    solution = Solution(width, height)
+    solution.grid[:] = np.asarray(colors, dtype=np.int32).reshape(height, width)
+    return solution
+
+
+class Checkpoint:
+    """ Periodically saves the state of an enumeration: the solutions found so far, the blocking
+    clauses added to the encoder and some run metadata. The file is a gzipped pickle of plain
+    arrays; it is written to a temporary file and then renamed, so a crash while saving never
+    corrupts the previous checkpoint. """
+
+    def __init__(self, config: Configurations, filename: str, interval: float):
+        self.config = config
+        self.filename = filename
+        self.interval = interval
+        self.last_save = time.time()
+        self.num_saves = 0
+
+    def due(self) -> bool:
+        """ Whether a new checkpoint should be saved. A non-positive interval disables them. """
+        return 0 < self.interval <= time.time() - self.last_save
+
+    def saved(self) -> bool:
+        """ Whether this run has a checkpoint file (saved or resumed), to be kept up to date. """
+        return self.num_saves > 0
+
+    def save(self, solutions, num_models: int, num_represented: int, elapsed: float,
+             blocking_clauses=None, done_cubes=()):
+        """ blocking_clauses is a ClauseStore or None, for backends that do not block models.
+        done_cubes are the finished cubes, each one a list of placements (p, i, j). """
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "config": asdict(self.config),
+            "num_models": num_models,
+            "num_represented": num_represented,
+            "elapsed": elapsed,
+            "saved_at": time.time(),
+            "solutions": [solution_to_array(solution) for solution in solutions],
+            "blocking_lits": blocking_clauses.lits if blocking_clauses is not None else None,
+            "blocking_offsets": blocking_clauses.offsets if blocking_clauses is not None else None,
+            "done_cubes": sorted(tuple(cube) for cube in done_cubes),
+        }
+        tmp_filename = self.filename + ".tmp"
+        with gzip.open(tmp_filename, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, self.filename)
+        self.last_save = time.time()
+        self.num_saves += 1
+
+    def load(self) -> dict:
+        """ Reads the checkpoint and rebuilds its solutions. """
+        with gzip.open(self.filename, "rb") as f:
+            state = pickle.load(f)
+        if state["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {state['version']}.")
+        for key in RESUME_KEYS:
+            if state["config"][key] != getattr(self.config, key):
+                raise ValueError(f"Checkpoint {self.filename} was made with {key}="
+                                 f"{state['config'][key]}, not {getattr(self.config, key)}.")
+        state["solutions"] = [solution_from_array(colors, self.config.width,
+                                                  self.config.height)
+                              for colors in state["solutions"]]
+        self.num_saves += 1
+        return state
+
+    @staticmethod
+    def blocking_clauses(state: dict):
+        """ Yields the blocking clauses saved in a checkpoint. """
+        lits, offsets = state["blocking_lits"], state["blocking_offsets"]
+        if lits is None:
+            return
+        for idx in range(len(offsets) - 1):
+            yield lits[offsets[idx]:offsets[idx + 1]].tolist()
@@ -0,0 +1,59 @@
+from array import array
+
+
+class ClauseStore:
+    """ Compact storage for CNF clauses: all DIMACS literals in one flat int array, plus the
+    offset where each clause starts. """
+
+    def __init__(self):
+        self.lits = array('i')
+        self.offsets = array('q', [0])
+
+    def append(self, clause):
+        """ Adds a clause, given as an iterable of DIMACS literals. """
+        self.lits.extend(clause)
+        self.offsets.append(len(self.lits))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> array:
+        if idx < 0:
+            idx += len(self)
+        return self.lits[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def __iter__(self):
+        return self.clauses()
+
+    def since(self, start: int) -> "ClauseStore":
+        """ Returns a new store with the clauses from index start onwards. """
+        store = ClauseStore()
+        base = self.offsets[start]
+        store.lits = self.lits[base:]
+        store.offsets = array('q', [offset - base for offset in self.offsets[start:]])
+        return store
+
+    def clauses(self, start: int = 0):
+        """ Yields every clause from index start onwards. """
+        lits, offsets = self.lits, self.offsets
+        for idx in range(start, len(self)):
+            yield lits[offsets[idx]:offsets[idx + 1]]
+
+    def write_dimacs(self, stream, num_vars: int, units=(), chunk_size: int = 1 << 16):
+        """ Writes the clauses in DIMACS to a binary stream (a file or a solver's stdin), in
+        chunks of about chunk_size bytes. units are extra unit clauses, e.g. assumptions.
+        Returns the number of bytes written. """
+        total = stream.write(f"c Pedro's XOXO\np cnf {num_vars} {len(self) + len(units)}\n"
+                             .encode())
+        buffer = [f"{lit} 0\n" for lit in units]
+        size = 0
+        for clause in self.clauses():
+            line = " ".join(map(str, clause)) + " 0\n"
+            buffer.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                total += stream.write("".join(buffer).encode())
+                buffer = []
+                size = 0
+        total += stream.write("".join(buffer).encode())
+        return total
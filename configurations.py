@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass
@@ -10,3 +11,31 @@ class Configurations:
     unique: bool
 
     print_constraints: bool
+
+    solver: str = "incremental"
+    encoding: str = "cells"
+    amo: str = "auto"
+    amo_threshold: int = 6
+    backend: str = "sat"
+    count: bool = False
+    pieces: str = "fixed"
+    break_symmetries: bool = False
+    dump_cnf: bool = False
+    jobs: int = 1
+    checkpoint_file: Optional[str] = None
+    checkpoint_interval: float = 600
+    resume: bool = False
+    render: bool = True
+    render_jobs: int = 1
+    store_file: Optional[str] = None
+    use_cache: bool = True
+    cache_dir: Optional[str] = None
+    cache_size: int = 1024
+    presolve: bool = True
+    portfolio: Optional[list[str]] = None
+    portfolio_stats: str = "portfolio_stats.json"
+    portfolio_size: Optional[int] = None
+    trace_file: Optional[str] = None
+    profile: Optional[str] = None
+    profile_output: str = "profile.pstats"
+    headless: bool = False
@@ -0,0 +1,201 @@
+import time
+
+import numpy as np
+
+from configurations import Configurations
+from polyomino import shape_ids
+from utils import nice_time
+
+
+# Counts are kept as 32-bit limbs in int64 arrays: adding up the counts of the (at most 2**31)
+# states that merge into one never overflows.
+LIMB_BITS = 32
+LIMB_MASK = (1 << LIMB_BITS) - 1
+# States are int64 keys, with the used pieces (with --unique) above the frontier mask.
+MAX_KEY_BITS = 62
+
+
+def merge_states(keys: np.ndarray, counts: np.ndarray, sources: np.ndarray):
+    """ The new state #s has key keys[s] and the count counts[sources[s]] of an old state.
+    Adds up the counts of equal keys; returns the distinct keys and their counts. """
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    counts = np.add.reduceat(counts[sources[order]], starts, axis=0)
+    for limb in range(counts.shape[1] - 1):
+        counts[:, limb + 1] += counts[:, limb] >> LIMB_BITS
+        counts[:, limb] &= LIMB_MASK
+    if (counts[:, -1] > LIMB_MASK).any():
+        counts = np.concatenate((counts, counts[:, -1:] >> LIMB_BITS), axis=1)
+        counts[:, -2] &= LIMB_MASK
+    return keys[starts], counts
+
+
+class TilingCounter:
+    """ Counts the tilings of a board with a broken-profile dynamic program.
+    The board is swept along its longer side, one line of (at most) min(width, height) cells
+    at a time. A state is the bitmask of the already filled cells ahead of the current cell;
+    each polyomino is placed when its first cell (in sweep order) is the current cell, so
+    every tiling is counted exactly once and no Solution is ever built.
+    The number of states grows exponentially with the length of the lines. For k=4 there are
+    up to about 2,000 states with lines of 6 cells, 40,000 with 8 and millions with 10. So
+    boards up to 8 cells across (e.g. 8 x 100) are counted in seconds, but 10 x 100 takes
+    minutes: that is the scope of this counter. """
+
+    def __init__(self, config: Configurations, polyominoes):
+        self.width = config.width
+        self.height = config.height
+        self.unique = config.unique
+        self.polyominoes = sorted(polyominoes)
+        self.shape_ids = shape_ids(self.polyominoes, config.pieces)
+        self.num_shapes = max(self.shape_ids) + 1
+        self.k = self.polyominoes[0].k()
+        # Sweep columns of height n if the board is wider than tall, rows of width n otherwise.
+        self.by_columns = self.height <= self.width
+        self.n = self.height if self.by_columns else self.width
+        self.length = self.width if self.by_columns else self.height
+        self.offsets = [self.sweep_offsets(polyomino) for polyomino in self.polyominoes]
+        # bits of the frontier: cells from the current one to the farthest that a piece reaches
+        self.frontier_bits = max(da * self.n + db for offsets in self.offsets
+                                 for da, db in offsets) + 1
+        self._transitions = {}
+
+    def sweep_offsets(self, polyomino):
+        """ Coordinates of the polyomino as (along, across) offsets from its first cell. """
+        if self.by_columns:
+            cells = sorted((c[1], c[0]) for c in polyomino.coords())
+        else:
+            cells = sorted((c[0], c[1]) for c in polyomino.coords())
+        a0, b0 = cells[0]
+        return [(a - a0, b - b0) for a, b in cells]
+
+    def fitting_pieces(self, a: int, b: int):
+        """ Returns (p_idx, mask) of the pieces that fit in the board with their first cell
+        at (a, b). Bit t of mask is the cell t positions ahead of (a, b) in sweep order. """
+        fits = []
+        for p_idx, offsets in enumerate(self.offsets):
+            if all(a + da < self.length and 0 <= b + db < self.n for da, db in offsets):
+                fits.append((p_idx, sum(1 << (da * self.n + db) for da, db in offsets)))
+        return fits
+
+    def transitions(self, a: int, b: int):
+        """ fitting_pieces(a, b), which only depends on b and on how close a is to the end (a
+        piece spans fewer than k lines), computed once for each. """
+        key = (b, min(self.length - a, self.k))
+        if key not in self._transitions:
+            self._transitions[key] = self.fitting_pieces(a, b)
+        return self._transitions[key]
+
+    def count(self) -> int:
+        """ Returns the exact number of tilings of the board. """
+        if self.frontier_bits + (self.num_shapes if self.unique else 0) <= MAX_KEY_BITS:
+            return self.count_arrays()
+        if self.unique:
+            return self.count_unique()
+        return self.count_dicts()
+
+    def count_arrays(self) -> int:
+        """ count() with the states in NumPy arrays: their keys (the used pieces above the
+        frontier mask) and their counts, in 32-bit limbs (least significant first). """
+        used_bits = ((1 << self.num_shapes) - 1) << self.frontier_bits if self.unique else 0
+        keys = np.zeros(1, dtype=np.int64)
+        counts = np.ones((1, 1), dtype=np.int64)
+        for a in range(self.length):
+            for b in range(self.n):
+                is_open = (keys & 1) == 0
+                filled, open_states = np.flatnonzero(~is_open), np.flatnonzero(is_open)
+                open_keys = keys[open_states]
+                new_keys, sources = [keys[filled]], [filled]
+                for p_idx, piece_mask in self.transitions(a, b):
+                    if self.unique:
+                        piece_mask |= 1 << (self.frontier_bits + self.shape_ids[p_idx])
+                    fits = np.flatnonzero((open_keys & piece_mask) == 0)
+                    new_keys.append(open_keys[fits] | piece_mask)
+                    sources.append(open_states[fits])
+                keys = np.concatenate(new_keys)
+                if not len(keys):
+                    return 0
+                keys = ((keys & ~used_bits) >> 1) | (keys & used_bits)
+                keys, counts = merge_states(keys, counts, np.concatenate(sources))
+        return sum(sum(int(limb) << (LIMB_BITS * l) for l, limb in enumerate(row))
+                   for row in counts.tolist())
+
+    def count_dicts(self) -> int:
+        """ count() with the states in a dict, for frontiers too long for int64 keys. """
+        # state: filled cells mask -> number of partial tilings
+        states = {0: 1}
+        for a in range(self.length):
+            for b in range(self.n):
+                fits = [piece_mask for _, piece_mask in self.transitions(a, b)]
+                new_states = {}
+                get = new_states.get
+                for mask, ways in states.items():
+                    if mask & 1:
+                        new_states[mask >> 1] = get(mask >> 1, 0) + ways
+                        continue
+                    for piece_mask in fits:
+                        if not mask & piece_mask:
+                            key = (mask | piece_mask) >> 1
+                            new_states[key] = get(key, 0) + ways
+                states = new_states
+        return sum(states.values())
+
+    def count_unique(self) -> int:
+        """ count_dicts(), but each piece (in any orientation) is used at most once. """
+        # state: (filled cells mask, used pieces mask) -> number of partial tilings
+        states = {(0, 0): 1}
+        for a in range(self.length):
+            for b in range(self.n):
+                fits = [(1 << self.shape_ids[p_idx], piece_mask)
+                        for p_idx, piece_mask in self.transitions(a, b)]
+                new_states = {}
+                get = new_states.get
+                for (mask, used), ways in states.items():
+                    if mask & 1:
+                        key = (mask >> 1, used)
+                        new_states[key] = get(key, 0) + ways
+                        continue
+                    for piece_bit, piece_mask in fits:
+                        if not mask & piece_mask and not used & piece_bit:
+                            key = ((mask | piece_mask) >> 1, used | piece_bit)
+                            new_states[key] = get(key, 0) + ways
+                states = new_states
+        return sum(states.values())
+
+
+def cross_check(boards=((4, 3, 3), (4, 4, 4), (5, 4, 2), (6, 3, 3), (5, 5, 5)), unique=False,
+                pieces="fixed"):
+    """ Compares the counter with the number of models found by the SAT enumeration loop. """
+    from main import build_polyominoes
+    from placement_encoder import PlacementEncoder
+    from solvers import make_solver
+
+    for w, h, k in boards:
+        config = Configurations(w, h, k, unique, False, encoding="placements", pieces=pieces)
+        polyominoes = build_polyominoes(k)
+        start_time = time.time()
+        count = TilingCounter(config, polyominoes).count()
+        count_time = time.time() - start_time
+
+        start_time = time.time()
+        encoder = PlacementEncoder(config, polyominoes)
+        encoder.encode()
+        solver = make_solver(config.solver, encoder)
+        num_models = 0
+        result, model = solver.solve()
+        while result == 1:
+            num_models += 1
+            encoder.block_model(model)
+            result, model = solver.solve()
+        solver.close()
+        sat_time = time.time() - start_time
+        status = "OK" if count == num_models else "MISMATCH"
+        print(f"{w}x{h} k={k}{f' unique {pieces}' if unique else ''}: counted {count} in "
+              f"{nice_time(count_time)}, SAT found {num_models} in {nice_time(sat_time)}. {status}")
+
+
+if __name__ == '__main__':
+    cross_check()
+    cross_check(((4, 4, 4), (5, 4, 4), (4, 3, 3)), unique=True)
+    cross_check(((5, 4, 4), (6, 3, 3), (6, 5, 5)), unique=True, pieces="one-sided")
+    cross_check(((5, 4, 4), (6, 3, 3), (6, 5, 5)), unique=True, pieces="free")
@@ -0,0 +1,160 @@
+from configurations import Configurations
+from placements import placement_matrix
+from polyomino import shape_ids
+from solution import Solution
+
+
+class DancingLinks:
+    """ Knuth's Algorithm X with dancing links.
+    Columns 0..num_primary-1 must be covered exactly once; the remaining (secondary) columns
+    may be covered at most once. Rows are lists of column indices. """
+
+    def __init__(self, num_primary: int, num_secondary: int, rows):
+        num_cols = num_primary + num_secondary
+        # Node 0 is the root, nodes 1..num_cols are the column headers.
+        self.left = list(range(num_cols + 1))
+        self.right = list(range(num_cols + 1))
+        for c in range(num_primary + 1):
+            # secondary columns are not reachable from the root
+            self.right[c] = c + 1 if c < num_primary else 0
+            self.left[c] = c - 1 if c > 0 else num_primary
+        self.up = list(range(num_cols + 1))
+        self.down = list(range(num_cols + 1))
+        self.column = list(range(num_cols + 1))
+        self.size = [0] * (num_cols + 1)
+        self.row_of = [-1] * (num_cols + 1)
+
+        for r, row in enumerate(rows):
+            first = None
+            for col in row:
+                c = col + 1
+                node = len(self.column)
+                self.column.append(c)
+                self.row_of.append(r)
+                self.up.append(self.up[c])
+                self.down.append(c)
+                self.down[self.up[c]] = node
+                self.up[c] = node
+                self.size[c] += 1
+                if first is None:
+                    first = node
+                    self.left.append(node)
+                    self.right.append(node)
+                else:
+                    self.left.append(self.left[first])
+                    self.right.append(first)
+                    self.right[self.left[first]] = node
+                    self.left[first] = node
+
+    def cover(self, c: int):
+        left, right, up, down, column, size = \
+            self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[c]] = right[c]
+        left[right[c]] = left[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(self, c: int):
+        left, right, up, down, column, size = \
+            self.left, self.right, self.up, self.down, self.column, self.size
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = c
+        left[right[c]] = c
+
+    def select(self, r: int):
+        """ Adds the row of node r to the cover. """
+        j = self.right[r]
+        while j != r:
+            self.cover(self.column[j])
+            j = self.right[j]
+
+    def unselect(self, r: int):
+        """ Undoes select(r). """
+        j = self.left[r]
+        while j != r:
+            self.uncover(self.column[j])
+            j = self.left[j]
+
+    def solutions(self):
+        """ Yields every exact cover as a list of row indices. The search is iterative, with a
+        stack of the chosen rows, so that it is not limited by Python's recursion depth. """
+        right, down, size = self.right, self.down, self.size
+        columns = []  # column covered at each level
+        chosen = []  # node of the row chosen at each level
+        while True:
+            if right[0] == 0:
+                yield [self.row_of[r] for r in chosen]
+            else:
+                # Choose the primary column with fewest candidate rows.
+                c = right[0]
+                best = c
+                while c != 0:
+                    if size[c] < size[best]:
+                        best = c
+                    c = right[c]
+                if size[best] > 0:
+                    self.cover(best)
+                    columns.append(best)
+                    chosen.append(down[best])
+                    self.select(chosen[-1])
+                    continue
+            # Backtrack to the deepest level that has another row to try.
+            while chosen:
+                r = chosen.pop()
+                self.unselect(r)
+                r = down[r]
+                if r != columns[-1]:
+                    chosen.append(r)
+                    self.select(r)
+                    break
+                self.uncover(columns.pop())
+            else:
+                return
+
+
+class DLXTiler:
+    """ Enumerates tilings as an exact cover problem: each board cell is a primary column and
+    each placement of a polyomino is a row. With unique pieces, each piece (all orientations of
+    a shape) is also a secondary column, so that it is placed at most once. """
+
+    def __init__(self, config: Configurations, polyominoes):
+        self.width = config.width
+        self.height = config.height
+        self.unique = config.unique
+        self.polyominoes = sorted(polyominoes)
+        self.num_polyominoes = len(self.polyominoes)
+        self.shape_ids = shape_ids(self.polyominoes, config.pieces)
+        self.num_shapes = max(self.shape_ids) + 1
+        self.matrix = placement_matrix(self.polyominoes, self.width, self.height)
+
+        rows = self.matrix.cells.tolist()
+        if self.unique:
+            for row, p in zip(rows, self.matrix.pieces.tolist()):
+                row.append(self.width * self.height + self.shape_ids[p])
+        self.dlx = DancingLinks(self.width * self.height,
+                                self.num_shapes if self.unique else 0, rows)
+
+    def get_solution(self, rows) -> Solution:
+        solution = Solution(self.width, self.height)
+        self.matrix.fill(solution.grid, rows)
+        return solution
+
+    def solutions(self):
+        """ Yields every tiling of the board as a Solution. """
+        for rows in self.dlx.solutions():
+            yield self.get_solution(rows)
@@ -1,12 +1,16 @@
-import re
 from itertools import combinations
+from math import ceil, log2, sqrt
 
+import numpy as np
+
+from clauses import ClauseStore
 from configurations import Configurations
-from polyomino import Polyomino
+from placements import placement_matrix
+from polyomino import Polyomino, shape_ids
 from solution import Solution
 
 
-def neg(lit: str): return lit[1:] if lit[0] == '-' else '-' + lit
+def neg(lit: int): return -lit
 
 
 class Encoder:
@@ -15,42 +19,58 @@ class Encoder:
         self.width = config.width
         self.height = config.height
         self.unique = config.unique
+        self.amo = config.amo
+        self.amo_threshold = config.amo_threshold
         self.polyominoes = sorted(polyominoes)
         self.num_polyominoes = len(self.polyominoes)
+        self.shape_ids = shape_ids(self.polyominoes, config.pieces)
+        self.num_shapes = max(self.shape_ids) + 1
         assert all(map(lambda p: p.k() == self.polyominoes[0].k(), self.polyominoes))
 
         # for i, polyomino in enumerate(self.polyominoes):
         #     print(f"Polyomino #{i}:")
         #     print(str(polyomino))
 
-        self._vars = {}
+        self.k = self.polyominoes[0].k()
+        self.num_vars = 0
         self.init_vars()
-        self.constraints = []
+        self.num_base_vars = self.num_vars
+        self.constraints = ClauseStore()
+        # encoding -> [#constraints, #aux. vars, #clauses]
+        self.cardinality_stats = {}
 
-    def p(self, i: int, j: int, p: int, l: int):
+    def p(self, i: int, j: int, p: int, l: int) -> int:
         assert 0 <= i < self.height, f"i: {i}"
         assert 0 <= j < self.width, f"j: {j}"
+        return ((i * self.width + j) * self.num_polyominoes + p) * self.k + l + 1
 
+    def p_name(self, i: int, j: int, p: int, l: int) -> str:
         return f"p_{str(i).rjust(len(str(self.height - 1)), '0')}_" \
                f"{str(j).rjust(len(str(self.width - 1)), '0')}_" \
                f"{str(p).rjust(len(str(self.num_polyominoes - 1)), '0')}_" \
-               f"{str(l).rjust(len(str(self.polyominoes[p].k() - 1)), '0')}"
+               f"{str(l).rjust(len(str(self.k - 1)), '0')}"
 
-    @staticmethod
-    def de_p(p_name: str):
-        rgx = r"p_(\d+)_(\d+)_(\d+)_(\d+)"
-        return map(int, re.match(rgx, p_name).groups())
+    def placement_literal(self, p: int, i: int, j: int):
+        """ Literal that is true iff polyomino p is placed at anchor (i, j), i.e., tile #0 is there. """
+        first = self.polyominoes[p].coords()[0]
+        return self.p(i + first[0], j + first[1], p, 0)
 
-    def init_vars(self):
-        # p vars
-        for i in range(self.height):
-            for j in range(self.width):
-                for p in range(self.num_polyominoes):
-                    for l in range(self.polyominoes[p].k()):
-                        self.add_var(self.p(i, j, p, l))
+    def de_p(self, var: int):
+        """ Inverse of p(): returns (i, j, p, l). """
+        rest, l = divmod(var - 1, self.k)
+        rest, p = divmod(rest, self.num_polyominoes)
+        i, j = divmod(rest, self.width)
+        return i, j, p, l
 
-    def add_var(self, var: str):
-        self._vars[var] = len(self._vars) + 1
+    def var_name(self, var: int) -> str:
+        """ Human-readable name of a variable, only used to print constraints. """
+        if var <= self.num_base_vars:
+            return self.p_name(*self.de_p(var))
+        return f"a_{var - self.num_base_vars - 1}"
+
+    def init_vars(self):
+        # p vars: p(i, j, p, l) is computed arithmetically, so there is nothing to store.
+        self.num_vars = self.height * self.width * self.num_polyominoes * self.k
 
     def add_constraint(self, constraint):
         """add constraints, which is a list of literals"""
@@ -58,84 +78,197 @@ class Encoder:
         assert (isinstance(constraint, list))
         self.constraints.append(constraint)
 
+    def new_aux_var(self) -> int:
+        """ Creates a fresh auxiliary variable, used by the cardinality encodings. """
+        self.num_vars += 1
+        return self.num_vars
+
     def add_sum_eq1(self, sum_lits):
         """
         encodes clauses SUM(sum_lits) = 1.
         """
         self.add_sum_le1(sum_lits)
-        # self.add_sum_le1_sc(sum_lits)
         self.add_sum_ge1(sum_lits)
 
-    def add_sum_le1(self, sum_lits):
+    def amo_encoding_for(self, num_lits: int) -> str:
+        """ Chooses the at-most-one encoding to use for num_lits literals. """
+        if self.amo != "auto":
+            return self.amo
+        return "pairwise" if num_lits <= self.amo_threshold else "sequential"
+
+    def add_sum_le1(self, sum_lits, encoding: str = None):
         """
-        encodes clauses SUM(sum_lits) <= 1 using pairwise encoding.
+        encodes clauses SUM(sum_lits) <= 1, using the given encoding or the one chosen by
+        amo_encoding_for().
         """
         if len(sum_lits) == 0 or len(sum_lits) == 1:
             return
+        if encoding is None:
+            encoding = self.amo_encoding_for(len(sum_lits))
+        num_vars, num_clauses = self.num_vars, len(self.constraints)
+        self._add_amo(sum_lits, encoding)
+        stats = self.cardinality_stats.setdefault(encoding, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += self.num_vars - num_vars
+        stats[2] += len(self.constraints) - num_clauses
+
+    def _add_amo(self, sum_lits, encoding: str):
+        if len(sum_lits) <= 1:
+            return
+        if len(sum_lits) <= 2 or encoding == "pairwise":
+            self.add_sum_le1_pairwise(sum_lits)
+        elif encoding == "sequential":
+            self.add_sum_le1_sc(sum_lits)
+        elif encoding == "ladder":
+            self.add_sum_le1_ladder(sum_lits)
+        elif encoding == "commander":
+            self.add_sum_le1_commander(sum_lits)
+        elif encoding == "product":
+            self.add_sum_le1_product(sum_lits)
+        elif encoding == "bimander":
+            self.add_sum_le1_bimander(sum_lits)
+        else:
+            raise ValueError(f"Unknown at-most-one encoding: {encoding}.")
+
+    def _add_amo_rec(self, sum_lits, encoding: str):
+        """ AMO over the auxiliary variables of a recursive encoding. """
+        if len(sum_lits) <= self.amo_threshold:
+            encoding = "pairwise"
+        self._add_amo(sum_lits, encoding)
 
+    def add_sum_le1_pairwise(self, sum_lits):
+        """
+        encodes clauses SUM(sum_lits) <= 1 using pairwise encoding.
+        """
         lit_pairs = list(combinations(sum_lits, 2))
         for lit_pair in lit_pairs:
             self.add_constraint([neg(lit_pair[0]), neg(lit_pair[1])])
 
+    def add_sum_le1_sc(self, sum_lits):
+        """
+        encodes clauses SUM(sum_lits) <= 1 using a sequential counter (Sinz, 2005).
+        s_i is true if some of the first i literals is true.
+        """
+        n = len(sum_lits)
+        s = [self.new_aux_var() for _ in range(n - 1)]
+        self.add_constraint([neg(sum_lits[0]), s[0]])
+        for i in range(1, n - 1):
+            self.add_constraint([neg(sum_lits[i]), s[i]])
+            self.add_constraint([neg(s[i - 1]), s[i]])
+            self.add_constraint([neg(sum_lits[i]), neg(s[i - 1])])
+        self.add_constraint([neg(sum_lits[n - 1]), neg(s[n - 2])])
+
+    def add_sum_le1_ladder(self, sum_lits):
+        """
+        encodes clauses SUM(sum_lits) <= 1 using the ladder encoding (Gent and Nightingale, 2004).
+        y_1 ... y_n-1 is a ladder (y_i+1 -> y_i), and x_i -> y_i-1 /\ -y_i.
+        """
+        n = len(sum_lits)
+        y = [self.new_aux_var() for _ in range(n - 1)]
+        for i in range(n - 2):
+            self.add_constraint([neg(y[i + 1]), y[i]])
+        self.add_constraint([neg(sum_lits[0]), neg(y[0])])
+        for i in range(1, n - 1):
+            self.add_constraint([neg(sum_lits[i]), y[i - 1]])
+            self.add_constraint([neg(sum_lits[i]), neg(y[i])])
+        self.add_constraint([neg(sum_lits[n - 1]), y[n - 2]])
+
+    def add_sum_le1_commander(self, sum_lits, group_size: int = 3):
+        """
+        encodes clauses SUM(sum_lits) <= 1 using the commander encoding (Klieber and Kwon, 2007).
+        Literals are split in groups; each true literal implies its group's commander, and
+        commanders are recursively constrained to at most one.
+        """
+        commanders = []
+        for g in range(0, len(sum_lits), group_size):
+            group = sum_lits[g:g + group_size]
+            self.add_sum_le1_pairwise(group)
+            commander = self.new_aux_var()
+            for lit in group:
+                self.add_constraint([neg(lit), commander])
+            commanders.append(commander)
+        self._add_amo_rec(commanders, "commander")
+
+    def add_sum_le1_product(self, sum_lits):
+        """
+        encodes clauses SUM(sum_lits) <= 1 using the product encoding (Chen, 2010).
+        Literals are laid out in a grid, each one implies its row and column, and rows and columns
+        are recursively constrained to at most one.
+        """
+        num_rows = ceil(sqrt(len(sum_lits)))
+        num_cols = ceil(len(sum_lits) / num_rows)
+        rows = [self.new_aux_var() for _ in range(num_rows)]
+        cols = [self.new_aux_var() for _ in range(num_cols)]
+        for idx, lit in enumerate(sum_lits):
+            self.add_constraint([neg(lit), rows[idx // num_cols]])
+            self.add_constraint([neg(lit), cols[idx % num_cols]])
+        self._add_amo_rec(rows, "product")
+        self._add_amo_rec(cols, "product")
+
+    def add_sum_le1_bimander(self, sum_lits, group_size: int = 2):
+        """
+        encodes clauses SUM(sum_lits) <= 1 using the bimander encoding (Nguyen and Mai, 2015).
+        Literals are split in groups, and each true literal forces the binary representation of
+        its group's index on log2(#groups) auxiliary variables.
+        """
+        groups = [sum_lits[g:g + group_size] for g in range(0, len(sum_lits), group_size)]
+        bits = [self.new_aux_var() for _ in range(max(1, ceil(log2(len(groups)))))]
+        for g_idx, group in enumerate(groups):
+            self.add_sum_le1_pairwise(group)
+            for lit in group:
+                for b_idx, bit in enumerate(bits):
+                    self.add_constraint([neg(lit), bit if (g_idx >> b_idx) & 1 else neg(bit)])
+
+    def print_cardinality_stats(self):
+        for encoding, (num, num_aux, num_clauses) in sorted(self.cardinality_stats.items()):
+            print(f"# at-most-one '{encoding}': {num} constraints, {num_aux} aux. vars, "
+                  f"{num_clauses} clauses.")
+
     def add_sum_ge1(self, sum_lits):
         """
-        encodes clauses SUM(sum_lits) <= 1.
+        encodes clauses SUM(sum_lits) >= 1.
         """
         self.add_constraint(sum_lits)
 
     def encode(self):
+        self.matrix = placement_matrix(self.polyominoes, self.width, self.height)
         self.encode_board_constraints()
         for p_idx, polyomino in enumerate(self.polyominoes):
             self.encode_polyomino(polyomino, p_idx)
 
-    def make_dimacs(self):
-        """ Encode constraints as CNF in DIMACS. """
-        s = ''
-        s += "c Pedro's XOXO\n"
-        s += f"p cnf {len(self._vars)} {len(self.constraints)}\n"
-        for ctr in self.constraints:
-            assert all([var in self._vars or neg(var) in self._vars for var in ctr])
-            s += " ".join(map(str, [self._vars[var] if var in self._vars else -self._vars[neg(var)]
-                                    for var in ctr]))
-            s += ' 0\n'
-        # assert len(s.split('\n')) == len(self.constraints) + 1
-        with open("ex.cnf", 'w') as f:
-            f.write(s)
-        return s
+    def write_dimacs(self, stream, units=()):
+        """ Streams the constraints (and extra unit clauses) as CNF in DIMACS to a binary stream,
+        in chunks. Returns the number of bytes written. """
+        return self.constraints.write_dimacs(stream, self.num_vars, units)
+
+    def dump_dimacs(self, filename: str = "ex.cnf"):
+        with open(filename, 'wb') as f:
+            self.write_dimacs(f)
 
     def print_constraints(self):
-        # for ctr in self.constraints:
-        #     print(f"{{{', '.join(ctr)}}}")
         with open("constraints.txt", "w+") as f:
             for ctr in self.constraints:
-                f.write(f"{{{', '.join(ctr)}}}\n")
+                names = [self.var_name(lit) if lit > 0 else '-' + self.var_name(-lit) for lit in ctr]
+                f.write(f"{{{', '.join(names)}}}\n")
 
-    def print_model(self, model: dict):
-        reversed_vars = {value: key for (key, value) in self._vars.items()}
+    def print_model(self, model):
         for var_id in model:
-            assert var_id in reversed_vars.keys(), f"{var_id}"
-            if reversed_vars[var_id].startswith("p") and model[var_id]:
-                i, j, k, l = self.de_p(reversed_vars[var_id])
+            if var_id <= self.num_base_vars:
+                i, j, k, l = self.de_p(var_id)
                 print("p", i, j, k, l)
 
-    def block_model(self, model: dict):
-        reversed_vars = {value: key for (key, value) in self._vars.items()}
-        ctr = []
-        for var_idx in model:
-            if reversed_vars[var_idx].startswith("p") and model[var_idx]:
-                lit = neg(reversed_vars[var_idx])
-                ctr.append(lit)
+    def block_model(self, model):
+        ctr = [neg(var_id) for var_id in model if var_id <= self.num_base_vars]
         assert len(ctr) == self.height * self.width
         self.add_constraint(ctr)
 
     def get_solution(self, model):
-        reversed_vars = {value: key for (key, value) in self._vars.items()}
-        solution = Solution()
+        """ model is the list of variables that are true. """
+        solution = Solution(self.width, self.height)
         for var_id in model:
-            assert var_id in reversed_vars.keys()
-            if reversed_vars[var_id].startswith("p") and model[var_id]:
-                i, j, p, l = self.de_p(reversed_vars[var_id])
-                assert (i, j) not in solution.colors
+            if var_id <= self.num_base_vars:
+                i, j, p, l = self.de_p(var_id)
+                assert not solution.has_color(i, j)
                 solution.add_color(i, j, p)
         return solution
 
@@ -145,64 +278,60 @@ class Encoder:
             for j in range(self.width):
                 to_sum = []
                 for p in range(self.num_polyominoes):
-                    for l in range(self.polyominoes[p].k()):
+                    for l in range(self.k):
                         to_sum.append(self.p(i, j, p, l))
                 self.add_sum_eq1(to_sum)
         if self.unique:
-            # One cell per piece:
-            for p in range(self.num_polyominoes):
-                for l in range(self.polyominoes[p].k()):
+            # One cell per piece, over all orientations of that piece:
+            for shape in range(self.num_shapes):
+                orientations = [p for p in range(self.num_polyominoes)
+                                if self.shape_ids[p] == shape]
+                for l in range(self.polyominoes[orientations[0]].k()):
                     to_sum = []
-                    for i in range(self.height):
-                        for j in range(self.width):
-                            to_sum.append(self.p(i, j, p, l))
+                    for p in orientations:
+                        for i in range(self.height):
+                            for j in range(self.width):
+                                to_sum.append(self.p(i, j, p, l))
                     self.add_sum_le1(to_sum)
 
     def encode_polyomino(self, polyomino: Polyomino, p_idx):
+        # p(i, j, p_idx, l) of the tiles of each legal placement, from the cells it covers
+        first_row = int(self.matrix.first_rows[p_idx])
+        rows = self.matrix.cells[first_row:self.matrix.first_rows[p_idx + 1]]
+        placement_lits = ((rows.astype(np.int64) * self.num_polyominoes + p_idx) * self.k +
+                          np.arange(1, self.k + 1)).tolist()
         for i in range(self.height):
             for j in range(self.width):
-                if not self.valid_position(i, j, polyomino):
-                    for l in range(polyomino.k()):
-                        try:
-                            pos_l = self.p(i + polyomino.coords()[l][0],
-                                           j + polyomino.coords()[l][1],
-                                           p_idx, l)
-                        except AssertionError:
-                            continue
-                        self.add_constraint([neg(pos_l)])
+                q = self.matrix.index(p_idx, i, j)
+                if q == -1:
+                    # the tiles that are in the board cannot be there
+                    for l, (ci, cj) in enumerate(polyomino.coords()):
+                        if i + ci < self.height and j + cj < self.width:
+                            self.add_constraint([neg(self.p(i + ci, j + cj, p_idx, l))])
                 else:
                     # each part is in its position relative to part #0
                     # pos0 <-> pos1 /\ pos0 <-> pos2 /\ pos0 <-> pos3, etc
-                    for l0 in range(polyomino.k()):
-                        pos_l0 = self.p(i + polyomino.coords()[l0][0],
-                                        j + polyomino.coords()[l0][1],
-                                        p_idx, l0)
-                        for l1 in range(l0, polyomino.k()):
-                            pos_l1 = self.p(i + polyomino.coords()[l1][0],
-                                            j + polyomino.coords()[l1][1],
-                                            p_idx, l1)
+                    lits = placement_lits[q - first_row]
+                    for l0, pos_l0 in enumerate(lits):
+                        for pos_l1 in lits[l0:]:
                             self.add_constraint([neg(pos_l0), pos_l1])
                             self.add_constraint([neg(pos_l1), pos_l0])
-        max_i = max(map(lambda coord: coord[0], polyomino.coords()))
-        max_j = max(map(lambda coord: coord[1], polyomino.coords()))
+        max_i = polyomino.height() - 1
+        max_j = polyomino.width() - 1
         for l, c in enumerate(polyomino.coords()):
-            for i in range(c[0]):  # Do not put second-line parts on the first line
+            # Only rows and columns in the board: p() does not check them under python -O.
+            # Do not put second-line parts on the first line
+            for i in range(min(c[0], self.height)):
                 for j in range(self.width):
                     self.add_constraint([neg(self.p(i, j, p_idx, l))])
-            for i in range(max_i - c[0] - self.height + 1):
+            for i in range(min(max_i - c[0] - self.height + 1, self.height)):
                 for j in range(self.width):
                     self.add_constraint([neg(self.p(i, j, p_idx, l))])
 
-            for j in range(c[1]):  # Do not put second-column parts on the first column
+            # Do not put second-column parts on the first column
+            for j in range(min(c[1], self.width)):
                 for i in range(self.height):
                     self.add_constraint([neg(self.p(i, j, p_idx, l))])
-            for j in range(max_j - c[1] - self.width + 1):
+            for j in range(min(max_j - c[1] - self.width + 1, self.width)):
                 for i in range(self.height):
                     self.add_constraint([neg(self.p(i, j, p_idx, l))])
-
-    def valid_position(self, i, j, polyomino):
-        min_i = min(map(lambda coord: i + coord[0], polyomino.coords()))
-        max_i = max(map(lambda coord: i + coord[0], polyomino.coords()))
-        min_j = min(map(lambda coord: j + coord[1], polyomino.coords()))
-        max_j = max(map(lambda coord: j + coord[1], polyomino.coords()))
-        return min_i >= 0 and min_j >= 0 and max_i < self.height and max_j < self.width
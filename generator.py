@@ -0,0 +1,110 @@
+import time
+from multiprocessing import Pool
+
+from polyomino import Polyomino
+from utils import nice_time
+
+# Number of fixed polyominoes with n cells, for n = 1, 2, ... (OEIS A001168).
+A001168 = [1, 2, 6, 19, 63, 216, 760, 2725, 9910, 36446, 135268, 505861, 1903890, 7204874,
+           27394666, 104592937]
+
+# With this many cells or more, fixed_polyominoes() uses a process pool by default.
+PARALLEL_MIN_K = 12
+
+
+def neighbors(cell):
+    return [(cell[0] + 1, cell[1]), (cell[0], cell[1] + 1),
+            (cell[0] - 1, cell[1]), (cell[0], cell[1] - 1)]
+
+
+def allowed(cell):
+    """ Cells that may belong to a polyomino whose first cell (in row-major order) is (0, 0). """
+    return cell[0] > 0 or (cell[0] == 0 and cell[1] >= 0)
+
+
+def extend(k: int, cells: list, untried: list, reached: set, depth: int = None):
+    """ Redelmeier's algorithm. Extends cells with every untried cell, in turn, until size k.
+    A cell that was tried remains in reached, so that the siblings that follow never add it
+    again; that is what makes every fixed polyomino appear exactly once.
+    Yields the coordinates of each polyomino of size k or, if depth is given, the state
+    (cells, untried, reached) of each subtree at that size. """
+    untried = list(untried)
+    while untried:
+        cell = untried.pop()
+        new_cells = [n for n in neighbors(cell) if allowed(n) and n not in reached]
+        reached.update(new_cells)
+        cells.append(cell)
+        if len(cells) == k:
+            yield tuple(cells)
+        elif depth is not None and len(cells) == depth:
+            yield list(cells), untried + new_cells, set(reached)
+        else:
+            yield from extend(k, cells, untried + new_cells, reached, depth)
+        cells.pop()
+        reached.difference_update(new_cells)
+
+
+def _extend_subtree(args):
+    k, cells, untried, reached = args
+    return list(extend(k, cells, untried, reached))
+
+
+def fixed_polyominoes(k: int, processes: int = None):
+    """ Yields every fixed polyomino of size k exactly once.
+    With processes > 1 (default for k >= PARALLEL_MIN_K), the search tree is split in subtrees
+    a few cells deep, which are extended by a pool of worker processes. """
+    assert k >= 1
+    if processes is None:
+        processes = None if k >= PARALLEL_MIN_K else 1
+    origin = (0, 0)
+    if processes == 1 or k <= 4:
+        for coords in extend(k, [], [origin], {origin}):
+            yield Polyomino(coords)
+        return
+
+    depth = min(k - 1, 6)
+    subtrees = [(k,) + subtree for subtree in extend(k, [], [origin], {origin}, depth)]
+    with Pool(processes) as pool:
+        for polyominoes in pool.imap_unordered(_extend_subtree, subtrees):
+            for coords in polyominoes:
+                yield Polyomino(coords)
+
+
+def grow_polyominoes(k: int) -> set[Polyomino]:
+    """ Former build_polyominoes(): grows every polyomino of size n - 1 by each border cell,
+    removing duplicates with a set. Kept for benchmarking. """
+    polyominoes = set()
+    polyominoes.add(Polyomino(((0, 0),)))
+    num_tiles = 1
+    while num_tiles < k:
+        new_polyominoes = set()
+        for poly in polyominoes:
+            for new_tile in poly.border():
+                new_polyomino_set = set(poly.coords())
+                new_polyomino_set.add(new_tile)
+                new_polyominoes.add(Polyomino(new_polyomino_set))
+        polyominoes = new_polyominoes
+        num_tiles += 1
+    return polyominoes
+
+
+def check_and_benchmark(max_k: int = 10, max_k_growth: int = 9):
+    """ Checks the number of generated polyominoes against OEIS A001168, and times the
+    generator against the former build_polyominoes(). """
+    for k in range(1, max_k + 1):
+        start_time = time.time()
+        polyominoes = list(fixed_polyominoes(k))
+        elapsed = time.time() - start_time
+        assert len(set(polyominoes)) == len(polyominoes), f"Repeated polyominoes for k={k}."
+        status = "OK" if len(polyominoes) == A001168[k - 1] else f"expected {A001168[k - 1]}"
+        line = f"k={k}: {len(polyominoes)} polyominoes ({status}) in {nice_time(elapsed)}"
+        if k <= max_k_growth:
+            start_time = time.time()
+            grown = grow_polyominoes(k)
+            line += f"; growth took {nice_time(time.time() - start_time)}"
+            assert grown == set(polyominoes)
+        print(line + ".")
+
+
+if __name__ == '__main__':
+    check_and_benchmark()
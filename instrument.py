@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+
+# Instrumentation is off unless enable() is called: span() then returns a shared no-op object
+# and count() returns right away.
+enabled = False
+# Name of the span profiled with cProfile, or None.
+profile_phase = None
+
+_origin = time.perf_counter()
+_spans = []  # (name, start, duration, args)
+_counters = {}
+_profiler = None
+_profile_depth = 0
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """ A named, timed region of the pipeline. Spans named profile_phase are profiled. """
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        global _profile_depth
+        if self.name == profile_phase:
+            # Nested spans with the same name are profiled by the outermost one.
+            if _profile_depth == 0:
+                _profiler.enable()
+            _profile_depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _profile_depth
+        end = time.perf_counter()
+        if self.name == profile_phase:
+            _profile_depth -= 1
+            if _profile_depth == 0:
+                _profiler.disable()
+        if enabled:
+            _spans.append((self.name, self.start - _origin, end - self.start, self.args))
+        return False
+
+
+def span(name: str, **args):
+    """ Returns a context manager that times the code inside it as span name. """
+    if not enabled and name != profile_phase:
+        return NULL_SPAN
+    return Span(name, args)
+
+
+def count(name: str, amount: int = 1):
+    """ Adds amount to counter name. """
+    if enabled:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def enable():
+    """ Turns on the recording of spans and counters. """
+    global enabled
+    enabled = True
+
+
+def enable_profile(profile: str):
+    """ Profiles every span named profile with cProfile. """
+    global profile_phase, _profiler
+    import cProfile
+    profile_phase = profile
+    _profiler = cProfile.Profile()
+
+
+def summary():
+    """ {span name: (#calls, total seconds)} and the counters. """
+    totals = {}
+    for name, _, duration, _ in _spans:
+        calls, total = totals.get(name, (0, 0.0))
+        totals[name] = (calls + 1, total + duration)
+    return totals, dict(_counters)
+
+
+def print_summary():
+    totals, counters = summary()
+    for name, (calls, total) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        print(f"# span '{name}': {calls} calls, {total:.3f}s.")
+    for name, value in sorted(counters.items()):
+        print(f"# counter '{name}': {value}.")
+
+
+def write_trace(filename: str):
+    """ Writes the spans and counters in Chrome's trace format (for chrome://tracing or
+    Perfetto) if filename ends with '.json', and as JSON lines otherwise. """
+    pid, tid = os.getpid(), threading.get_ident()
+    with open(filename, "w") as f:
+        if filename.endswith(".json"):
+            events = [{"name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6,
+                       "pid": pid, "tid": tid, "args": args}
+                      for name, start, duration, args in _spans]
+            end = time.perf_counter() - _origin
+            events.extend({"name": name, "ph": "C", "ts": end * 1e6, "pid": pid,
+                           "args": {name: value}} for name, value in _counters.items())
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        else:
+            for name, start, duration, args in _spans:
+                f.write(json.dumps({"span": name, "start": start, "duration": duration,
+                                    **args}) + "\n")
+            f.write(json.dumps({"counters": _counters}) + "\n")
+
+
+def write_profile(filename: str, top: int = 20):
+    """ Saves the profile of profile_phase (for pstats or snakeviz) and prints its top
+    functions by cumulative time. """
+    import pstats
+    if _profiler is None:
+        return
+    _profiler.dump_stats(filename)
+    print(f"# profile of '{profile_phase}' written to {filename}. Top {top} functions:")
+    pstats.Stats(_profiler).sort_stats("cumulative").print_stats(top)
@@ -2,192 +2,384 @@ import argparse
 import os
 import shutil
 import socket
-import subprocess
 import time
 from typing import Optional
 
+import instrument
+import placements
+import render
+from cache import DEFAULT_CACHE_DIR, Cache
+from checkpoint import Checkpoint, default_checkpoint_file
 from configurations import Configurations
+from counter import TilingCounter
+from dlx import DLXTiler
 from encoder import Encoder
-from polyomino import Polyomino
+from generator import fixed_polyominoes
+from parallel import enumerate_cubes, make_cubes
+from placement_encoder import PlacementEncoder
+from polyomino import Polyomino, shape_ids
+from presolve import Presolve
+from render import RenderPool
+from solution import Solution
+from solvers import make_solver, portfolio_args
+from store import SolutionStore
+from symmetry import BoardSymmetries
+from utils import nice_time
 from webpage_info import webpage_style, webpage_index
 
 config: Optional["Configurations"] = None
-solver = "cadical"
 solutions = set()
+checkpoint: Optional["Checkpoint"] = None
+# On-disk cache of polyominoes, placements and base CNFs; None with --no-cache.
+cache: Optional["Cache"] = None
+# Result of the checks done before encoding; None with --no-presolve.
+presolved: Optional["Presolve"] = None
+# Background rendering of solutions; None with --no-render.
+renderer: Optional["RenderPool"] = None
+# Binary file where new solutions are appended, with --store.
+store: Optional["SolutionStore"] = None
+# State loaded from a checkpoint, with --resume.
+resumed: Optional[dict] = None
 inesc_servers = ["centaurus", "musca", "octans", "scutum", "spica", "serpens", "sextans", "crux",
                  "crater", "corvus", "dorado"]
 
 
-def sign(lit): return lit[0] == '-'
-
-
-def var(lit): return lit[1:] if lit[0] == '-' else lit
-
-
-def nice_time(total_seconds):
-    """ Prints a time in a nice, legible format. """
-    if total_seconds < 60:
-        return f'{round(total_seconds, 1)}s'
-    total_seconds = round(total_seconds)
-    mins, secs = divmod(total_seconds, 60)
-    hours, mins = divmod(mins, 60)
-    days, hours = divmod(hours, 24)
-    ret = ''
-    if days > 0:
-        ret += f'{days}d'
-    if hours > 0:
-        ret += f'{hours}h'
-    if mins > 0:
-        ret += f'{mins}m'
-    ret += f'{secs}s'
-    return ret
-
-
 def build_polyominoes(k: int) -> set[Polyomino]:
-    # IDEA: Start with a polyomino of size 1. Then compute all polyominoes of size 2,
-    # by adding one square to the neighborhood. Same of size 3.
-    polyominoes = set()
-    polyominoes.add(Polyomino(((0, 0),)))
-    num_tiles = 1
-    while num_tiles < k:
-        new_polyominoes = set()
-        for poly in polyominoes:
-            for new_tile in poly.border():
-                new_polyomino_set = set(poly.coords())
-                new_polyomino_set.add(new_tile)
-                new_polyominoes.add(Polyomino(new_polyomino_set))
-        polyominoes = new_polyominoes
-        num_tiles += 1
-    return polyominoes
-
-
-def get_model(lines):
-    """ Returns a dict from positive integer DIMACS var ids to bools. """
-    vals = dict()
-    found = False
-    for line in lines:
-        line = line.rstrip()
-        if not line:
-            continue
-        if not line.startswith('v ') and not line.startswith('V '):
-            continue
-        found = True
-        vs = line.split()[1:]
-        for v in vs:
-            if v == '0':
-                break
-            vals[int(var(v))] = not sign(v)
-    return vals if found else None
-
-
-def send_to_solver(cnf: str):
-    """ Pipe a DIMACS string to solver. """
-    global config
-    print(f"# sending to solver '{solver}'...", end=' ')
-    start_time = time.time()
-    p = subprocess.Popen(solver, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                         stderr=subprocess.PIPE)
-    po, pe = p.communicate(input=bytes(cnf, encoding='utf-8'))
-    print(f"took {nice_time(time.time() - start_time)}.")
-    print("# decoding result from solver...", end=' ')
-    start_time = time.time()
-    rc = p.returncode
-    s_out = str(po, encoding='utf-8').splitlines()
-    s_err = str(pe, encoding='utf-8').split()
-    # print('\n'.join(s_out), file=sys.stderr)
-    # print('\n'.join(s_err), file=sys.stderr)
-    # print(cnf, file=sys.stderr)
-    # print(s_out)
-    print(f"took {nice_time(time.time() - start_time)}.")
-
-    if rc == 10:
-        model = get_model(s_out)
-        return 1, model
-    elif rc == 20:
-        return 0, None
-    else:
-        raise ValueError(f"Something wrong with solver {solver}.")
+    """ Returns all fixed polyominoes of size k. """
+    with instrument.span("generate", k=k):
+        if cache is not None:
+            polyominoes, _ = cache.polyominoes(k, config.pieces, fixed_polyominoes)
+            return set(polyominoes)
+        return set(fixed_polyominoes(k))
 
 
-def handle_sat(model: dict, encoder, elapsed, save_dir):
+def handle_sat(solution: Solution, elapsed, save_dir, orbit_size: int = None):
     """ Print everything after a positive reply from the solver. """
-    solution = encoder.get_solution(model)
-    if True:  # config.print_model:
-        encoder.print_model(model)
     print("SAT")
     print(f"# Solution #{len(solutions) + 1} after {nice_time(elapsed)}:")
     print(solution)
+    if orbit_size is not None:
+        print(f"# Orbit size: {orbit_size}.")
     print(f"# End of solution #{len(solutions) + 1}. "
           f"Avg. {nice_time(elapsed / (len(solutions) + 1))} per solution.")
     if solution in solutions:
         print("# Repeated solution. Not saving.")
         return
 
-    if save_dir is not None:
-        filename = save_dir + f'polyominoes_{len(solutions):03}.svg'
-        solution.show(filename)
-    else:
-        solution.show()
+    if renderer is not None:
+        filename = None
+        if save_dir is not None:
+            filename = save_dir + f'polyominoes_{len(solutions):03}.svg'
+        with instrument.span("render_submit"):
+            renderer.submit(solution, filename)
+    if store is not None:
+        with instrument.span("store_append"):
+            store.append(solution)
     solutions.add(solution)
 
 
 def main():
-    global config
+    global config, checkpoint, resumed, renderer, store, cache, presolved
 
     assert (config.width * config.height) % config.k == 0, \
         f"The number of tiles in the board ({config.width}x{config.height}" \
         f"={config.width * config.height}) must be a multiple of the size of " \
         f"polyominoes ({config.k})."
 
+    if config.use_cache:
+        cache = Cache(config.cache_dir or DEFAULT_CACHE_DIR, config.cache_size << 20)
+        placements.placement_cache = cache
     polyominoes = build_polyominoes(config.k)
+    if config.presolve:
+        print("# presolving...", end=' ')
+        start_time = time.time()
+        with instrument.span("presolve"):
+            presolved = Presolve(config, polyominoes).run()
+        print(f"took {nice_time(time.time() - start_time)}.")
+        presolved.report()
+        if presolved.infeasible is not None:
+            print("# End of all solutions.")
+            print("# 0 models, 0 distinct solutions.")
+            return
+        polyominoes = set(presolved.polyominoes)
+    if config.count:
+        count_tilings(polyominoes)
+        return
+
+    checkpoint = Checkpoint(config, config.checkpoint_file or default_checkpoint_file(config),
+                            config.checkpoint_interval)
+    if config.resume:
+        resumed = checkpoint.load()
+        solutions.update(resumed["solutions"])
+        print(f"# Resuming from {checkpoint.filename}: {resumed['num_models']} models, "
+              f"{len(solutions)} distinct solutions after {nice_time(resumed['elapsed'])}.")
+
     if socket.gethostname() in inesc_servers:
         save_dir = f"/home/macf/public_html/polyominoes/" \
                    f"configs_{config.width}x{config.height}_{config.k}{'_u' if config.unique else ''}/"
-        if os.path.exists(save_dir):
+        if os.path.exists(save_dir) and resumed is None:
             shutil.rmtree(save_dir)
-        os.mkdir(save_dir)
+        os.makedirs(save_dir, exist_ok=True)
         with open(save_dir + "style.css", "w") as f:
             f.write(webpage_style)
         with open(save_dir + "index.php", "w") as f:
             f.write(webpage_index)
     else:
         save_dir = None
-    assert all(map(lambda p: p._k == config.k, polyominoes))
+    assert all(map(lambda p: p.k() == config.k, polyominoes))
     print(f"Generated {len(polyominoes)} polyominoes of size {config.k}.")
-    encoder = Encoder(config, polyominoes)
-    print(f"# encoding with {encoder.__class__.__name__}...", end=' ')
+    if config.pieces != "fixed":
+        num_shapes = max(shape_ids(list(polyominoes), config.pieces)) + 1
+        print(f"# {num_shapes} {config.pieces} pieces.")
+    if config.store_file is not None:
+        if os.path.exists(config.store_file) and resumed is None:
+            os.remove(config.store_file)
+        store = SolutionStore(config.store_file, config.width, config.height, config.k,
+                              sorted(polyominoes))
+    if config.render and not config.headless:
+        renderer = RenderPool(config.render_jobs, to_files=save_dir is not None)
+    try:
+        if config.backend == "dlx":
+            enumerate_dlx(polyominoes, save_dir)
+        else:
+            enumerate_sat(polyominoes, save_dir)
+    finally:
+        if store is not None:
+            print(f"# {len(store)} solutions in {store.filename}.")
+            store.close()
+        if renderer is not None:
+            print("# waiting for renders...", end=' ')
+            start_time = time.time()
+            renderer.close()
+            print(f"took {nice_time(time.time() - start_time)}, "
+                  f"{renderer.num_rendered} solutions rendered.")
+
+
+def count_tilings(polyominoes):
+    """ Counts the solutions with a transfer-matrix dynamic program, without enumerating them. """
+    print(f"# counting tilings of {config.width}x{config.height} with {len(polyominoes)} "
+          f"polyominoes of size {config.k}...", end=' ')
     start_time = time.time()
-    encoder.encode()
+    count = TilingCounter(config, polyominoes).count()
     print(f"took {nice_time(time.time() - start_time)}.")
+    print(f"# {count} tilings.")
+
+
+def resume_counters():
+    """ Returns (#models, #models represented, start time), taking a resumed run into account. """
+    if resumed is None:
+        return 0, 0, time.time()
+    return resumed["num_models"], resumed["num_represented"], time.time() - resumed["elapsed"]
+
+
+def save_checkpoint(num_models, num_represented, start_time, blocking_clauses=None,
+                    done_cubes=()):
+    print(f"# saving checkpoint to {checkpoint.filename}...", end=' ')
+    save_start = time.time()
+    with instrument.span("checkpoint"):
+        checkpoint.save(solutions, num_models, num_represented, time.time() - start_time,
+                        blocking_clauses, done_cubes)
+    print(f"took {nice_time(time.time() - save_start)}.")
+
+
+def build_sat_encoder(polyominoes):
+    """ Returns the encoder, with all constraints (and symmetry breaking, if enabled). """
+    if config.encoding == "placements":
+        encoder = PlacementEncoder(config, polyominoes)
+    else:
+        encoder = Encoder(config, polyominoes)
+    print(f"# encoding with {encoder.__class__.__name__}...", end=' ')
+    start_time = time.time()
+    cached = False
+    with instrument.span("encode", encoder=encoder.__class__.__name__):
+        if cache is not None:
+            # Everything but the board and the polyominoes that changes the base CNF.
+            options = (config.unique, config.pieces, config.amo, config.amo_threshold)
+            cached = cache.encode(encoder, options)
+        else:
+            encoder.encode()
+    print(f"took {nice_time(time.time() - start_time)}{' (cached)' if cached else ''}.")
+    if presolved is not None:
+        for poly, i, j in presolved.forced:
+            encoder.add_constraint([encoder.placement_literal(encoder.polyominoes.index(poly),
+                                                              i, j)])
+    print(f"# {encoder.num_vars} variables, {len(encoder.constraints)} clauses.")
+    encoder.print_cardinality_stats()
+    instrument.count("base_clauses", len(encoder.constraints))
+
+    symmetries = None
+    if config.break_symmetries:
+        symmetries = BoardSymmetries(config, polyominoes)
+        print(f"# breaking {symmetries.group_size()} board symmetries...", end=' ')
+        start_time = time.time()
+        num_clauses = len(encoder.constraints)
+        with instrument.span("symmetry_breaking"):
+            symmetries.add_lex_leader(encoder)
+        print(f"took {nice_time(time.time() - start_time)}, "
+              f"{len(encoder.constraints) - num_clauses} clauses.")
 
     if config.print_constraints:
         print("# Encoded constraints")
         encoder.print_constraints()
         print("# End encoded constraints")
+    if config.dump_cnf:
+        encoder.dump_dimacs()
+    return encoder, symmetries
 
-    start_time = time.time()
-    result, model = send_to_solver(encoder.make_dimacs())
-    num_sat_calls = 0
+
+def enumerate_sat(polyominoes, save_dir):
+    """ Finds all solutions by repeatedly calling a SAT solver and blocking each model. """
+    encoder, symmetries = build_sat_encoder(polyominoes)
+    if config.jobs > 1:
+        enumerate_sat_parallel(encoder, symmetries, save_dir)
+        return
+
+    num_base_clauses = len(encoder.constraints)
+    num_sat_calls, num_represented, start_time = resume_counters()
+    if resumed is not None:
+        for clause in Checkpoint.blocking_clauses(resumed):
+            encoder.add_constraint(clause)
+
+    solver = make_solver(config.solver, encoder, **portfolio_args(config))
+    with instrument.span("solve"):
+        result, model = solver.solve()
     print("# All solutions.")
     while result == 1:
         assert model is not None
         num_sat_calls += 1
-        handle_sat(model, encoder, time.time() - start_time, save_dir)
+        instrument.count("models_found")
+        if True:  # config.print_model:
+            encoder.print_model(model)
+        orbit_size = None
+        if symmetries is not None:
+            orbit_size = symmetries.orbit_size(symmetries.model_placements(encoder, model))
+            num_represented += orbit_size
+        with instrument.span("get_solution"):
+            solution = encoder.get_solution(model)
+        handle_sat(solution, time.time() - start_time, save_dir, orbit_size)
 
         # block this model
         print("# blocking model...")
-        encoder.block_model(model)
+        with instrument.span("block_model"):
+            encoder.block_model(model)
+        instrument.count("blocking_clauses")
         if config.print_constraints:
             print("# Encoded constraints")
             encoder.print_constraints()
             print("# End of encoded constraints")
+        if checkpoint.due():
+            save_checkpoint(num_sat_calls, num_represented, start_time,
+                            encoder.constraints.since(num_base_clauses))
 
         # get new model
-        result, model = send_to_solver(encoder.make_dimacs())
+        with instrument.span("solve"):
+            result, model = solver.solve()
+    solver.close()
     elapsed = time.time() - start_time
+    if checkpoint.saved():
+        save_checkpoint(num_sat_calls, num_represented, start_time,
+                        encoder.constraints.since(num_base_clauses))
     print("# End of all solutions.")
     print(f"# {num_sat_calls} models, {len(solutions)} distinct solutions in "
           f"{nice_time(elapsed)}.")
+    if symmetries is not None:
+        print(f"# Up to symmetry: {num_sat_calls} models represent {num_represented} models.")
+
+
+def enumerate_sat_parallel(encoder, symmetries, save_dir):
+    """ Splits the search space in cubes, which are enumerated by config.jobs worker processes. """
+    print(f"# splitting in cubes for {config.jobs} jobs...", end=' ')
+    start_time = time.time()
+    cubes = make_cubes(encoder, min_cubes=8 * config.jobs)
+    print(f"took {nice_time(time.time() - start_time)}, {len(cubes)} cubes.")
+
+    num_base_clauses = len(encoder.constraints)
+    num_models, num_represented, start_time = resume_counters()
+    done_cubes = set()
+    if resumed is not None:
+        # Known models are blocked in every worker, and finished cubes are skipped.
+        for clause in Checkpoint.blocking_clauses(resumed):
+            encoder.add_constraint(clause)
+        # A cube is done if it extends a cube finished before, so that resuming with another
+        # split (e.g. another --jobs) never skips a part of the search space.
+        finished = [frozenset(cube) for cube in resumed["done_cubes"]]
+        done_cubes.update(idx for idx, cube in enumerate(cubes)
+                          if any(old <= frozenset(cube) for old in finished))
+        print(f"# {len(done_cubes)}/{len(cubes)} cubes already done.")
+
+    print("# All solutions.")
+    for cube_idx, found in enumerate_cubes(encoder, symmetries, config.solver, cubes, config.jobs,
+                                           skip=done_cubes):
+        for model, orbit_size in found:
+            num_models += 1
+            instrument.count("models_found")
+            if orbit_size is not None:
+                num_represented += orbit_size
+            with instrument.span("get_solution"):
+                solution = encoder.get_solution(model)
+            handle_sat(solution, time.time() - start_time, save_dir, orbit_size)
+            encoder.block_model(model)
+            instrument.count("blocking_clauses")
+        done_cubes.add(cube_idx)
+        print(f"# {len(done_cubes)}/{len(cubes)} cubes done.")
+        if checkpoint.due():
+            save_checkpoint(num_models, num_represented, start_time,
+                            encoder.constraints.since(num_base_clauses),
+                            [cubes[idx] for idx in done_cubes])
+    elapsed = time.time() - start_time
+    if checkpoint.saved():
+        save_checkpoint(num_models, num_represented, start_time,
+                        encoder.constraints.since(num_base_clauses),
+                        [cubes[idx] for idx in done_cubes])
+    print("# End of all solutions.")
+    print(f"# {num_models} models, {len(solutions)} distinct solutions in "
+          f"{nice_time(elapsed)}.")
+    if symmetries is not None:
+        print(f"# Up to symmetry: {num_models} models represent {num_represented} models.")
+
+
+def enumerate_dlx(polyominoes, save_dir):
+    """ Finds all solutions with Dancing Links, without going through a SAT solver. """
+    print("# building exact cover matrix...", end=' ')
+    start_time = time.time()
+    with instrument.span("exact_cover_matrix"):
+        tiler = DLXTiler(config, polyominoes)
+    print(f"took {nice_time(time.time() - start_time)}.")
+    print(f"# {len(tiler.matrix)} placements, {config.width * config.height} cells.")
+
+    symmetries = BoardSymmetries(config, polyominoes) if config.break_symmetries else None
+
+    num_tilings, num_represented, start_time = resume_counters()
+    # The search order is deterministic: on resume, skip the tilings found before.
+    num_skipped = num_tilings
+    print("# All solutions.")
+    for rows in tiler.dlx.solutions():
+        orbit_size = None
+        if symmetries is not None:
+            # Only keep the lexicographic leader of each orbit, as the SAT lex-leader constraints.
+            if not symmetries.is_canonical(rows):
+                continue
+            orbit_size = symmetries.orbit_size(rows)
+        if num_skipped > 0:
+            num_skipped -= 1
+            continue
+        if orbit_size is not None:
+            num_represented += orbit_size
+        num_tilings += 1
+        instrument.count("models_found")
+        with instrument.span("get_solution"):
+            solution = tiler.get_solution(rows)
+        handle_sat(solution, time.time() - start_time, save_dir, orbit_size)
+        if checkpoint.due():
+            save_checkpoint(num_tilings, num_represented, start_time)
+    elapsed = time.time() - start_time
+    if checkpoint.saved():
+        save_checkpoint(num_tilings, num_represented, start_time)
+    print("# End of all solutions.")
+    print(f"# {num_tilings} tilings, {len(solutions)} distinct solutions in "
+          f"{nice_time(elapsed)}.")
+    if symmetries is not None:
+        print(f"# Up to symmetry: {num_tilings} tilings represent {num_represented} tilings.")
 
 
 def read_cmd_args():
@@ -201,11 +393,114 @@ def read_cmd_args():
 
     parser.add_argument('-c', '--print-constraints', action='store_true',
                         help='Print all encoded constraints.')
+    parser.add_argument('--dump-cnf', action='store_true',
+                        help="Write the base encoding in DIMACS to 'ex.cnf'.")
+    parser.add_argument('-s', '--solver', choices=['incremental', 'subprocess', 'portfolio'],
+                        default='incremental',
+                        help="'incremental' keeps one in-process solver and only adds blocking "
+                             "clauses; 'subprocess' spawns a new solver for every model; "
+                             "'portfolio' races several solver processes for every model.")
+    parser.add_argument('--portfolio', nargs='+', default=None, metavar='CMD',
+                        help="Solver commands raced with --solver portfolio (default: cadical "
+                             "and kissat with a few seeds, if installed).")
+    parser.add_argument('--portfolio-size', type=int, default=None,
+                        help="Number of portfolio commands launched at once (default: all), "
+                             "picking those with most wins on the board first.")
+    parser.add_argument('--portfolio-stats', default='portfolio_stats.json',
+                        help="JSON file with the number of wins of each portfolio command per "
+                             "board, used to pick the commands to launch.")
+    parser.add_argument('-e', '--encoding', choices=['cells', 'placements'], default='cells',
+                        help="'cells' uses one variable per cell, polyomino and tile; "
+                             "'placements' uses one variable per legal placement of a polyomino.")
+    parser.add_argument('--amo', choices=['auto', 'pairwise', 'sequential', 'ladder', 'commander',
+                                          'product', 'bimander'], default='auto',
+                        help="At-most-one encoding. 'auto' uses pairwise up to --amo-threshold "
+                             "literals and a sequential counter above it.")
+    parser.add_argument('--amo-threshold', type=int, default=6,
+                        help="Largest number of literals encoded pairwise with --amo auto.")
+    parser.add_argument('-b', '--backend', choices=['sat', 'dlx'], default='sat',
+                        help="'sat' enumerates models with a SAT solver; 'dlx' enumerates "
+                             "tilings directly as an exact cover with Dancing Links.")
+    parser.add_argument('-p', '--pieces', choices=['fixed', 'one-sided', 'free'], default='fixed',
+                        help="Which orientations are the same piece: none ('fixed'), rotations "
+                             "('one-sided') or rotations and reflections ('free'). With --unique, "
+                             "each piece is used at most once.")
+    parser.add_argument('--break-symmetries', action='store_true',
+                        help="Only find one solution per orbit of the board's rotations and "
+                             "reflections, and report the size of each orbit.")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Number of worker processes for the SAT backend. The search space is "
+                             "split in cubes, which are enumerated in parallel.")
+    parser.add_argument('--checkpoint', dest='checkpoint_file', default=None,
+                        help="Checkpoint file (default: checkpoint_<w>x<h>_<k>[_u].ckpt).")
+    parser.add_argument('--checkpoint-interval', type=float, default=600,
+                        help="Seconds between checkpoints of the solutions found so far.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue the enumeration saved in the checkpoint file.")
+    parser.add_argument('--store', dest='store_file', default=None,
+                        help="Append every new solution to this binary solution store.")
+    parser.add_argument('--no-render', dest='render', action='store_false',
+                        help="Do not draw the solutions with matplotlib.")
+    parser.add_argument('--headless', action='store_true',
+                        help="Never import matplotlib (implies --no-render) and print solutions "
+                             "without terminal colors.")
+    parser.add_argument('--render-jobs', type=int, default=1,
+                        help="Number of background processes that draw the solutions.")
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                        help="Do not read or write the on-disk cache of polyominoes, placements "
+                             "and base CNFs.")
+    parser.add_argument('--cache-dir', default=None,
+                        help=f"Cache directory (default: $XOXO_CACHE_DIR or {DEFAULT_CACHE_DIR}).")
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help="Maximum size of the cache, in MB.")
+    parser.add_argument('--no-presolve', dest='presolve', action='store_false',
+                        help="Do not drop unusable polyominoes, fix forced placements and check "
+                             "area and parity before encoding.")
+    parser.add_argument('--trace', dest='trace_file', default=None,
+                        help="Record timed spans of every phase and counters, and write them "
+                             "to this file: in Chrome's trace format if it ends with '.json', "
+                             "as JSON lines otherwise.")
+    parser.add_argument('--profile', default=None, metavar='PHASE',
+                        help="Profile every span of this phase with cProfile, e.g. 'encode', "
+                             "'solve', 'get_solution', 'block_model' or 'render_submit'.")
+    parser.add_argument('--profile-output', default='profile.pstats',
+                        help="File where the profile of --profile is saved.")
+    parser.add_argument('--count', action='store_true',
+                        help='Only count the solutions, without enumerating them. Takes '
+                             'seconds for boards up to about 8 cells across with k=4, and '
+                             'minutes for 10.')
     args = parser.parse_args()
 
-    config = Configurations(args.w, args.h, args.k, args.unique, args.print_constraints)
+    config = Configurations(args.w, args.h, args.k, args.unique, args.print_constraints,
+                            args.solver, args.encoding, args.amo, args.amo_threshold,
+                            args.backend, args.count, args.pieces, args.break_symmetries,
+                            args.dump_cnf, args.jobs, args.checkpoint_file,
+                            args.checkpoint_interval, args.resume, args.render,
+                            args.render_jobs, args.store_file, args.use_cache, args.cache_dir,
+                            args.cache_size, args.presolve, args.portfolio,
+                            args.portfolio_stats, args.portfolio_size, args.trace_file,
+                            args.profile, args.profile_output, args.headless)
+
+
+def run():
+    """ Runs main() with the instrumentation and headless mode asked for in the command line. """
+    if config.headless:
+        render.headless = True
+    if config.trace_file is not None:
+        instrument.enable()
+    if config.profile is not None:
+        instrument.enable_profile(config.profile)
+    try:
+        main()
+    finally:
+        if config.trace_file is not None:
+            instrument.print_summary()
+            instrument.write_trace(config.trace_file)
+            print(f"# trace written to {config.trace_file}.")
+        if config.profile is not None:
+            instrument.write_profile(config.profile_output)
 
 
 if __name__ == '__main__':
     read_cmd_args()
-    main()
+    run()
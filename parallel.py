@@ -0,0 +1,80 @@
+from multiprocessing import Pool
+
+from placements import placement_matrix
+from solvers import make_solver
+
+# The worker process' solver state, set up by init_worker().
+_worker = None
+
+
+def make_cubes(encoder, min_cubes: int, max_depth: int = 4):
+    """ Splits the search space in disjoint cubes, each one a list of placements (p, i, j).
+    Starting from the empty cube, each cube is split by the placement that covers its first
+    uncovered cell (in row-major order), until there are at least min_cubes cubes. Cubes that
+    cannot be extended (no placement fits that cell) have no solutions and are dropped. """
+    matrix = placement_matrix(encoder.polyominoes, encoder.width, encoder.height)
+    placements = matrix.placements()
+    cells = [frozenset(matrix.cell_coords(q)) for q in range(len(matrix))]
+
+    cubes = [([], frozenset(), frozenset())]  # (placements, covered cells, used pieces)
+    depth = 0
+    while len(cubes) < min_cubes and depth < max_depth:
+        new_cubes = []
+        for cube, covered, used in cubes:
+            cell = next(((i, j) for i in range(encoder.height) for j in range(encoder.width)
+                         if (i, j) not in covered), None)
+            if cell is None:
+                new_cubes.append((cube, covered, used))
+                continue
+            for q in matrix.covering_placements(cell[0] * encoder.width + cell[1]).tolist():
+                shape = encoder.shape_ids[placements[q][0]]
+                if covered & cells[q] or (encoder.unique and shape in used):
+                    continue
+                new_cubes.append((cube + [placements[q]], covered | cells[q], used | {shape}))
+        cubes = new_cubes
+        depth += 1
+    return [cube for cube, _, _ in cubes]
+
+
+class CubeWorker:
+    """ Enumerates the solutions inside cubes, with its own solver and blocking clauses.
+    Blocking clauses are kept from one cube to the next: they are valid in every cube. """
+
+    def __init__(self, encoder, symmetries, solver_kind: str):
+        self.encoder = encoder
+        self.symmetries = symmetries
+        self.solver = make_solver(solver_kind, encoder, verbose=False)
+
+    def enumerate(self, cube):
+        """ Returns the (model, orbit size) pairs of every model in the cube. """
+        assumptions = [self.encoder.placement_literal(*placement) for placement in cube]
+        found = []
+        result, model = self.solver.solve(assumptions)
+        while result == 1:
+            orbit_size = None
+            if self.symmetries is not None:
+                orbit_size = self.symmetries.orbit_size(
+                    self.symmetries.model_placements(self.encoder, model))
+            found.append((model, orbit_size))
+            self.encoder.block_model(model)
+            result, model = self.solver.solve(assumptions)
+        return found
+
+
+def init_worker(encoder, symmetries, solver_kind: str):
+    global _worker
+    _worker = CubeWorker(encoder, symmetries, solver_kind)
+
+
+def enumerate_cube(indexed_cube):
+    idx, cube = indexed_cube
+    return idx, _worker.enumerate(cube)
+
+
+def enumerate_cubes(encoder, symmetries, solver_kind: str, cubes, jobs: int, skip=()):
+    """ Yields (cube index, [(model, orbit size), ...]) for every cube not in skip, cube by cube.
+    Cubes are handed out one at a time to a pool of jobs workers, so that a worker that
+    finishes a small cube immediately takes the next one. """
+    todo = [(idx, cube) for idx, cube in enumerate(cubes) if idx not in skip]
+    with Pool(jobs, initializer=init_worker, initargs=(encoder, symmetries, solver_kind)) as pool:
+        yield from pool.imap_unordered(enumerate_cube, todo, chunksize=1)
@@ -0,0 +1,67 @@
+import numpy as np
+
+from encoder import Encoder, neg
+from placements import placement_matrix
+from solution import Solution
+
+
+class PlacementEncoder(Encoder):
+    """ Encodes the board with one variable per legal placement (polyomino, anchor).
+    Only in-bounds placements get a variable, and each cell is covered by exactly one of the
+    placements that contain it. """
+
+    def x(self, p: int, i: int, j: int) -> int:
+        return self._placement_vars[(p, i, j)]
+
+    def x_name(self, p: int, i: int, j: int) -> str:
+        return f"x_{str(p).rjust(len(str(self.num_polyominoes - 1)), '0')}_" \
+               f"{str(i).rjust(len(str(self.height - 1)), '0')}_" \
+               f"{str(j).rjust(len(str(self.width - 1)), '0')}"
+
+    def placement_literal(self, p: int, i: int, j: int):
+        return self.x(p, i, j)
+
+    def de_x(self, var: int):
+        """ Inverse of x(): returns (p, i, j). """
+        return self.placements[var - 1]
+
+    def var_name(self, var: int) -> str:
+        if var <= self.num_base_vars:
+            return self.x_name(*self.de_x(var))
+        return f"a_{var - self.num_base_vars - 1}"
+
+    def init_vars(self):
+        # x vars: placement #q is variable q + 1
+        self.matrix = placement_matrix(self.polyominoes, self.width, self.height)
+        self.placements = self.matrix.placements()
+        self._placement_vars = {placement: q + 1 for q, placement in enumerate(self.placements)}
+        self.num_vars = len(self.placements)
+
+    def encode(self):
+        # Once piece per cell
+        for cell in range(self.height * self.width):
+            self.add_sum_eq1((self.matrix.covering_placements(cell) + 1).tolist())
+        if self.unique:
+            # Each piece is placed at most once, in any of its orientations:
+            shapes = np.array(self.shape_ids, dtype=np.int32)[self.matrix.pieces]
+            order = np.argsort(shapes, kind="stable")
+            starts = np.searchsorted(shapes[order], np.arange(self.num_shapes + 1))
+            for shape in range(self.num_shapes):
+                self.add_sum_le1((order[starts[shape]:starts[shape + 1]] + 1).tolist())
+
+    def print_model(self, model):
+        for var_id in model:
+            if var_id <= self.num_base_vars:
+                p, i, j = self.de_x(var_id)
+                print("x", p, i, j)
+
+    def block_model(self, model):
+        ctr = [neg(var_id) for var_id in model if var_id <= self.num_base_vars]
+        assert len(ctr) * self.k == self.height * self.width
+        self.add_constraint(ctr)
+
+    def get_solution(self, model):
+        solution = Solution(self.width, self.height)
+        model = np.asarray(model, dtype=np.int64)
+        self.matrix.fill(solution.grid, model[(model > 0) & (model <= self.num_base_vars)] - 1)
+        return solution
@@ -0,0 +1,111 @@
+import numpy as np
+
+# On-disk cache of placement matrices (a cache.Cache), set by main; None disables it.
+placement_cache = None
+
+
+class PlacementMatrix:
+    """ The incidence between the legal placements (polyomino, anchor) of a board and its cells.
+    Placement #q is polyomino pieces[q] at anchor anchors[q], and covers the cells cells[q]
+    (cell (i, j) is i * width + j); placements are ordered by polyomino, then row-major anchor.
+    The placements that cover cell c are covering[cell_starts[c]:cell_starts[c + 1]], in
+    increasing order. """
+
+    def __init__(self, width: int, height: int, k: int, pieces, anchors, cells, first_rows,
+                 anchor_cols):
+        self.width = width
+        self.height = height
+        self.k = k
+        self.pieces = pieces
+        self.anchors = anchors
+        self.cells = cells
+        # rows of polyomino p: first_rows[p]:first_rows[p + 1], anchor_cols[p] anchors per row
+        self.first_rows = first_rows
+        self.anchor_cols = anchor_cols
+        flat = cells.ravel()
+        if width * height <= 1 << 16:
+            # numpy's stable sort is a (faster) radix sort on 16-bit integers
+            flat = flat.astype(np.uint16)
+        order = np.argsort(flat, kind="stable")
+        self.covering = (order // k).astype(np.int32)
+        self.cell_starts = np.zeros(width * height + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells.ravel(), minlength=width * height),
+                  out=self.cell_starts[1:])
+
+    @classmethod
+    def build(cls, polyominoes, width: int, height: int) -> "PlacementMatrix":
+        """ Broadcasts the cells of the polyominoes over all their anchors, one bounding box
+        size at a time (polyominoes with the same box have the same anchors). """
+        k = polyominoes[0].k()
+        boxes = np.array([(poly.height(), poly.width()) for poly in polyominoes],
+                         dtype=np.int64).reshape(-1, 2)
+        anchor_rows = np.maximum(height - boxes[:, 0] + 1, 0)
+        anchor_cols = np.maximum(width - boxes[:, 1] + 1, 0)
+        first_rows = np.zeros(len(polyominoes) + 1, dtype=np.int64)
+        np.cumsum(anchor_rows * anchor_cols, out=first_rows[1:])
+        num_rows = int(first_rows[-1])
+        pieces = np.empty(num_rows, dtype=np.int32)
+        anchors = np.empty((num_rows, 2), dtype=np.int32)
+        cells = np.empty((num_rows, k), dtype=np.int32)
+        offsets = np.array([[i * width + j for i, j in poly.coords()] for poly in polyominoes],
+                           dtype=np.int32).reshape(-1, k)
+        for box in {tuple(box) for box in boxes.tolist()}:
+            ps = np.flatnonzero((boxes == box).all(axis=1))
+            num_i, num_j = height - box[0] + 1, width - box[1] + 1
+            if num_i <= 0 or num_j <= 0:
+                continue
+            ai, aj = np.divmod(np.arange(num_i * num_j, dtype=np.int32), num_j)
+            rows = first_rows[ps][:, None] + np.arange(num_i * num_j)
+            pieces[rows] = ps[:, None]
+            anchors[rows] = np.stack((ai, aj), axis=1)
+            cells[rows] = (ai * width + aj)[None, :, None] + offsets[ps][:, None, :]
+        return cls(width, height, k, pieces, anchors, cells, first_rows, anchor_cols)
+
+    def arrays(self) -> dict:
+        return {"pieces": self.pieces, "anchors": self.anchors, "cells": self.cells,
+                "first_rows": self.first_rows, "anchor_cols": self.anchor_cols}
+
+    @classmethod
+    def from_arrays(cls, width: int, height: int, arrays) -> "PlacementMatrix":
+        return cls(width, height, arrays["cells"].shape[1], arrays["pieces"], arrays["anchors"],
+                   arrays["cells"], arrays["first_rows"], arrays["anchor_cols"])
+
+    def __len__(self):
+        return len(self.pieces)
+
+    def placements(self):
+        """ The list of placements (p, i, j). """
+        return list(zip(self.pieces.tolist(), *self.anchors.T.tolist()))
+
+    def index(self, p: int, i: int, j: int) -> int:
+        """ Index of the placement of polyomino p at anchor (i, j), or -1 if it is not legal. """
+        num_cols = int(self.anchor_cols[p])
+        q = int(self.first_rows[p]) + i * num_cols + j
+        if not (0 <= i and 0 <= j < num_cols and q < self.first_rows[p + 1]):
+            return -1
+        return q
+
+    def covering_placements(self, cell: int) -> np.ndarray:
+        """ Indices of the placements that cover cell i * width + j. """
+        return self.covering[self.cell_starts[cell]:self.cell_starts[cell + 1]]
+
+    def cell_coords(self, q: int):
+        """ The cells (i, j) covered by placement #q. """
+        return [divmod(cell, self.width) for cell in self.cells[q].tolist()]
+
+    def fill(self, grid: np.ndarray, rows):
+        """ Colors the cells of each placement in rows with its polyomino index, in a
+        (height, width) grid. Placements must not overlap each other. """
+        rows = np.asarray(rows, dtype=np.int64)
+        cells = self.cells[rows]
+        flat = grid.reshape(-1)
+        assert len(np.unique(cells)) == cells.size and (flat[cells] == -1).all()
+        flat[cells] = self.pieces[rows][:, None]
+
+
+def placement_matrix(polyominoes, width: int, height: int) -> PlacementMatrix:
+    """ Returns the PlacementMatrix of the (sorted) polyominoes in the board. """
+    polyominoes = list(polyominoes)
+    if placement_cache is not None:
+        return placement_cache.placements(polyominoes, width, height, PlacementMatrix)
+    return PlacementMatrix.build(polyominoes, width, height)
@@ -1,30 +1,84 @@
 import random
+from functools import lru_cache
 from typing import Iterable
 
-from matplotlib import pyplot as plt
-from termcolor import colored
+from render import colored, render_polyomino, term_colors
 
-from solution import term_colors
+
+@lru_cache(maxsize=None)
+def reversed_rows(width: int) -> tuple:
+    """ reversed_rows(width)[x] is x < 2 ** width with its width bits in reverse order. """
+    table = [0] * (1 << width)
+    for x in range(1, 1 << width):
+        table[x] = (table[x >> 1] >> 1) | ((x & 1) << (width - 1))
+    return tuple(table)
+
+
+@lru_cache(maxsize=None)
+def spread_rows(width: int, stride: int) -> tuple:
+    """ spread_rows(width, stride)[x] has bit j * stride set for each bit j of x < 2 ** width,
+    i.e., turns a row of bits into a column of a stride wide box. """
+    table = [0] * (1 << width)
+    for x in range(1, 1 << width):
+        low = x & -x
+        table[x] = table[x ^ low] | 1 << ((low.bit_length() - 1) * stride)
+    return tuple(table)
 
 
 class Polyomino:
+    """ A fixed polyomino, translated so that it touches the top and left of its bounding box.
+    It is stored as an integer bitmask over the bounding box, where cell (i, j) is bit
+    i * width + j. Its cells (in row-major order), ordering key and hash are computed once. """
+    __slots__ = ("_mask", "_width", "_height", "_k", "_coords", "_key", "_hash")
+
     def __init__(self, coords: Iterable):
-        coords = self.adjust_coords(coords)
-        c_aux = set(coords)
-        self._k = len(c_aux)
-        self._coords = tuple(sorted(c_aux, key=lambda c: c[0] * self._k + c[1]))
+        coords = list(coords)
+        min_i, min_j = min(c[0] for c in coords), min(c[1] for c in coords)
+        width = max(c[1] for c in coords) - min_j + 1
+        mask = 0
+        for i, j in coords:
+            mask |= 1 << ((i - min_i) * width + j - min_j)
+        self._set_mask(mask, width, max(c[0] for c in coords) - min_i + 1)
+
+    @classmethod
+    def from_mask(cls, mask: int, width: int, height: int) -> "Polyomino":
+        """ The polyomino whose cells are the bits of mask, over a width x height bounding box
+        that it must touch on every side. """
+        poly = cls.__new__(cls)
+        poly._set_mask(mask, width, height)
+        return poly
+
+    def _set_mask(self, mask: int, width: int, height: int):
+        self._mask = mask
+        self._width = width
+        self._height = height
+        coords = []
+        bits = mask
+        while bits:
+            low = bits & -bits
+            coords.append(divmod(low.bit_length() - 1, width))
+            bits ^= low
+        self._coords = tuple(coords)
+        self._k = len(coords)
+        # Sum of the cells' row-major indices first, as always, then the cells to break ties.
+        self._key = (sum(c[0] * self._k + c[1] for c in coords), self._coords)
+        self._hash = hash((mask, width))
 
     def __eq__(self, other):
-        return self._coords == other._coords
+        return self._mask == other._mask and self._width == other._width
 
     def __hash__(self):
-        return hash(self._coords)
+        return self._hash
 
     def __lt__(self, other):
-        assert self._k == other.k()
-        ss = sum(map(lambda c: c[0] * self._k + c[1], self._coords))
-        so = sum(map(lambda c: c[0] * other.k() + c[1], other.coords()))
-        return ss < so
+        assert self._k == other._k
+        return self._key < other._key
+
+    def __getstate__(self):
+        return self._mask, self._width, self._height
+
+    def __setstate__(self, state):
+        self._set_mask(*state)
 
     def coords(self):
         return self._coords
@@ -32,39 +86,84 @@ class Polyomino:
     def k(self):
         return self._k
 
+    def mask(self) -> int:
+        return self._mask
+
+    def width(self) -> int:
+        return self._width
+
+    def height(self) -> int:
+        return self._height
+
+    def _rows(self):
+        """ The bits of each row of the bounding box, from the top. """
+        row_bits = (1 << self._width) - 1
+        return [(self._mask >> (i * self._width)) & row_bits for i in range(self._height)]
+
+    def rotated(self) -> "Polyomino":
+        """ This polyomino rotated by 90 degrees: row i becomes column height - 1 - i. """
+        spread = spread_rows(self._width, self._height)
+        mask = 0
+        for i, row in enumerate(self._rows()):
+            mask |= spread[row] << (self._height - 1 - i)
+        return Polyomino.from_mask(mask, self._height, self._width)
+
+    def reflected(self) -> "Polyomino":
+        """ This polyomino mirrored along the vertical axis: the bits of each row reversed. """
+        reverse = reversed_rows(self._width)
+        mask = 0
+        for i, row in enumerate(self._rows()):
+            mask |= reverse[row] << (i * self._width)
+        return Polyomino.from_mask(mask, self._width, self._height)
+
+    def board_mask(self, i: int, j: int, board_width: int) -> int:
+        """ Bitmask of the cells covered in a board_width wide board (cell (i, j) is bit
+        i * board_width + j) when placed at anchor (i, j). """
+        mask = 0
+        for row, bits in enumerate(self._rows()):
+            mask |= bits << ((i + row) * board_width + j)
+        return mask
+
     def border(self) -> set[tuple[int, int]]:
+        """ The cells outside this polyomino that are next to one of its cells. """
+        # The polyomino in a box with one more row and column on each side, so that shifts
+        # never wrap around to the other side of a row.
+        padded_width = self._width + 2
+        padded = self.board_mask(1, 1, padded_width)
+        neighbors = (padded << 1) | (padded >> 1) | (padded << padded_width) | \
+                    (padded >> padded_width)
+        neighbors &= ~padded
         border = set()
-        for tile in self._coords:
-            neighborhood = [(tile[0] - 1, tile[1]), (tile[0] + 1, tile[1]),
-                            (tile[0], tile[1] - 1), (tile[0], tile[1] + 1)]
-            for neighbor in neighborhood:
-                if neighbor not in self._coords:
-                    border.add(neighbor)
+        while neighbors:
+            low = neighbors & -neighbors
+            i, j = divmod(low.bit_length() - 1, padded_width)
+            border.add((i - 1, j - 1))
+            neighbors ^= low
         return border
 
+    def orientations(self, pieces: str = "free") -> set["Polyomino"]:
+        """ All fixed polyominoes that are the same piece as this one: only itself for 'fixed'
+        pieces, its rotations for 'one-sided' pieces and also their reflections for 'free'. """
+        if pieces == "fixed":
+            return {self}
+        orientations = set()
+        poly = self
+        for _ in range(4):
+            orientations.add(poly)
+            if pieces == "free":
+                orientations.add(poly.reflected())
+            poly = poly.rotated()
+        return orientations
+
     def show(self):
-        data = []
-        max_i = max(1, max(map(lambda coord: coord[0], self._coords)))
-        max_j = max(1, max(map(lambda coord: coord[1], self._coords)))
-        plt.figure(figsize=(max_j, max_i))
-        for i in range(max_i + 1):
-            data_r = []
-            for j in range(max_j + 1):
-                if (i, j) in self._coords:
-                    data_r.append(1)
-                else:
-                    data_r.append(-1)
-            data.append(data_r)
-        plt.imshow(data, cmap="Blues")
-        plt.axis('off')
-        plt.show(bbox_inches='tight')  # , pad_inches=0)
+        render_polyomino(self._coords)
 
     def __str__(self):
         ret = ''
         color_idx = random.randint(0, 5)
-        for i in range(max(map(lambda c: c[0], self.coords())) + 1):
-            for j in range(max(map(lambda c: c[1], self.coords())) + 1):
-                if (i, j) in self.coords():
+        for i in range(self._height):
+            for j in range(self._width):
+                if self._mask >> (i * self._width + j) & 1:
                     s = "X "
                     s = colored(s, term_colors[color_idx])
                 else:
@@ -73,8 +172,19 @@ class Polyomino:
             ret += '\n'
         return ret[:-1]
 
-    @staticmethod
-    def adjust_coords(coords):
-        min0 = min(map(lambda c: c[0], coords))
-        min1 = min(map(lambda c: c[1], coords))
-        return map(lambda c: (c[0] - min0, c[1] - min1), coords)
+
+def shape_ids(polyominoes: list[Polyomino], pieces: str = "fixed") -> list[int]:
+    """ Groups fixed polyominoes by piece ('fixed', 'one-sided' or 'free').
+    Returns, for each polyomino, the index of its piece; orientations of the same piece share
+    an index. Orientations are computed once per piece. """
+    ids = [-1] * len(polyominoes)
+    index = {poly: p_idx for p_idx, poly in enumerate(polyominoes)}
+    num_shapes = 0
+    for p_idx, poly in enumerate(polyominoes):
+        if ids[p_idx] != -1:
+            continue
+        for orientation in poly.orientations(pieces):
+            if orientation in index:
+                ids[index[orientation]] = num_shapes
+        num_shapes += 1
+    return ids
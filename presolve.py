@@ -0,0 +1,144 @@
+import numpy as np
+
+from configurations import Configurations
+from placements import placement_matrix
+from polyomino import shape_ids
+
+
+class Presolve:
+    """ Cheap checks and simplifications done before encoding a board:
+     - polyominoes without any legal placement are dropped;
+     - cells that only one placement can cover force that placement, which in turn rules out
+       the placements that overlap it (or use the same piece, with unique pieces), repeatedly;
+     - with unique pieces, the pieces left must have enough area to cover the board;
+     - checkerboard parity: each placement covers b black and k - b white cells, and the
+       imbalances of the chosen placements must add up to the board's.
+    After run(), infeasible holds the reason why the board has no tiling (or None), polyominoes
+    the polyominoes that are kept and forced the (polyomino, i, j) placements of every tiling. """
+
+    def __init__(self, config: Configurations, polyominoes):
+        self.width = config.width
+        self.height = config.height
+        self.unique = config.unique
+        self.pieces = config.pieces
+        self.polyominoes = sorted(polyominoes)
+        self.k = self.polyominoes[0].k()
+        self.infeasible = None
+        self.forced = []
+        self.steps = []
+
+    def run(self) -> "Presolve":
+        """ Runs every check, stopping at the first one that proves the board infeasible. """
+        for step in (self.drop_unplaceable, self.propagate_forced, self.check_area,
+                     self.check_parity):
+            step()
+            if self.infeasible is not None:
+                break
+        return self
+
+    def report(self):
+        for step in self.steps:
+            print(f"# presolve: {step}")
+        if self.infeasible is not None:
+            print(f"# presolve: infeasible, {self.infeasible}")
+
+    def _matrix(self):
+        """ The placement matrix of the polyominoes that are kept. """
+        return placement_matrix(self.polyominoes, self.width, self.height)
+
+    def _keep(self, used):
+        """ Keeps only the polyominoes whose index is in used. """
+        num_dropped = len(self.polyominoes) - len(used)
+        self.polyominoes = [poly for p, poly in enumerate(self.polyominoes) if p in used]
+        if not self.polyominoes:
+            self.infeasible = "no polyomino can be placed."
+        return num_dropped
+
+    def drop_unplaceable(self):
+        num_dropped = self._keep(set(np.unique(self._matrix().pieces).tolist()))
+        if num_dropped:
+            self.steps.append(f"dropped {num_dropped} polyominoes that do not fit in the board.")
+
+    def propagate_forced(self):
+        if self.infeasible is not None:
+            return
+        ids = np.array(shape_ids(self.polyominoes, self.pieces), dtype=np.int32)
+        matrix = self._matrix()
+        num_cells = self.width * self.height
+        alive = np.ones(len(matrix), dtype=bool)
+        covered = np.zeros(num_cells, dtype=bool)
+        forced = []
+        while True:
+            num_covering = np.bincount(matrix.cells[alive].ravel(), minlength=num_cells)
+            empty = np.flatnonzero(~covered & (num_covering == 0))
+            if len(empty):
+                cell = divmod(int(empty[0]), self.width)
+                self.infeasible = f"no placement can cover cell {cell}."
+                return
+            single = np.flatnonzero(~covered & (num_covering == 1))
+            if not len(single):
+                break
+            candidates = matrix.covering_placements(single[0])
+            q = int(candidates[alive[candidates]][0])
+            forced.append(q)
+            covered[matrix.cells[q]] = True
+            alive &= ~covered[matrix.cells].any(axis=1)
+            if self.unique:
+                alive &= ids[matrix.pieces] != ids[matrix.pieces[q]]
+            alive[q] = True
+        alive[forced] = False
+        self.forced = [(self.polyominoes[int(matrix.pieces[q])], *matrix.anchors[q].tolist())
+                       for q in forced]
+        if forced:
+            self.steps.append(f"fixed {len(forced)} placements that are the only way to cover "
+                              f"some cell.")
+        used = np.unique(np.concatenate((matrix.pieces[alive], matrix.pieces[forced])))
+        num_dropped = self._keep(set(used.tolist()))
+        if num_dropped:
+            self.steps.append(f"dropped {num_dropped} polyominoes whose placements are all "
+                              f"ruled out by fixed placements.")
+
+    def check_area(self):
+        if not self.unique:
+            return
+        num_shapes = max(shape_ids(self.polyominoes, self.pieces)) + 1
+        if num_shapes * self.k < self.width * self.height:
+            self.infeasible = f"{num_shapes} unique pieces of size {self.k} cover at most " \
+                              f"{num_shapes * self.k} of the {self.width * self.height} cells."
+        else:
+            self.steps.append(f"{num_shapes} unique pieces can cover the "
+                              f"{self.width * self.height} cells.")
+
+    def check_parity(self):
+        """ Checks that some choice of #pieces placements has the board's black - white
+        imbalance, only looking at the imbalance of each placement. """
+        board = sum(1 if (i + j) % 2 == 0 else -1
+                    for i in range(self.height) for j in range(self.width))
+        ids = np.array(shape_ids(self.polyominoes, self.pieces), dtype=np.int32)
+        matrix = self._matrix()
+        # imbalances that each piece (shape) can have, in any of its placements
+        rows, cols = np.divmod(matrix.cells, self.width)
+        placement_imbalances = (1 - 2 * ((rows + cols) % 2)).sum(axis=1)
+        imbalances = {}
+        for shape, imbalance in np.unique(np.stack((ids[matrix.pieces], placement_imbalances),
+                                                   axis=1), axis=0).tolist():
+            imbalances.setdefault(shape, set()).add(imbalance)
+        num_pieces = self.width * self.height // self.k
+        if self.unique:
+            # reachable (#pieces used, total imbalance), each piece used at most once
+            reachable = {(0, 0)}
+            for values in imbalances.values():
+                reachable |= {(n + 1, s + d) for n, s in reachable if n < num_pieces
+                              for d in values}
+            feasible = (num_pieces, board) in reachable
+        else:
+            values = set().union(*imbalances.values())
+            sums = {0}
+            for _ in range(num_pieces):
+                sums = {s + d for s in sums for d in values}
+            feasible = board in sums
+        if not feasible:
+            self.infeasible = f"no {num_pieces} placements have the board's checkerboard " \
+                              f"imbalance ({board})."
+        else:
+            self.steps.append(f"checkerboard imbalance ({board}) is reachable.")
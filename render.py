@@ -0,0 +1,95 @@
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+
+# Maximum number of renders waiting in the queue, per worker, before the solver has to wait.
+MAX_PENDING_PER_WORKER = 4
+
+term_colors = ["red", "green", "yellow", "blue", "magenta", "cyan"]
+
+# With headless set (--headless), nothing is drawn and text is printed without colors.
+headless = False
+
+
+def colored(text: str, color: str) -> str:
+    """ text in a terminal color. termcolor is only imported on first use. """
+    if headless:
+        return text
+    from termcolor import colored as term_colored
+    return term_colored(text, color)
+
+
+def import_pyplot():
+    """ Imports matplotlib's pyplot, which is only done by the code that draws. """
+    if headless:
+        raise RuntimeError("Cannot draw in headless mode.")
+    from matplotlib import pyplot as plt
+    return plt
+
+
+def render_polyomino(coords):
+    """ Shows a polyomino, given by its coordinates, with matplotlib. """
+    plt = import_pyplot()
+    max_i = max(1, max(map(lambda coord: coord[0], coords)))
+    max_j = max(1, max(map(lambda coord: coord[1], coords)))
+    fig, ax = plt.subplots(figsize=(max_j, max_i))
+    data = [[1 if (i, j) in coords else -1 for j in range(max_j + 1)] for i in range(max_i + 1)]
+    ax.imshow(data, cmap="Blues")
+    ax.axis('off')
+    plt.show()
+    plt.close(fig)
+
+
+def render_grid(grid: np.ndarray, filename=None):
+    """ Draws a solution's grid as a matplotlib heatmap, saved as SVG to filename or shown.
+    matplotlib is imported here, so that only the processes that render ever load it. """
+    plt = import_pyplot()
+
+    fig, ax = plt.subplots()
+    # colors, renumbered from 0 in increasing order
+    _, data = np.unique(grid, return_inverse=True)
+    ax.imshow(data.reshape(grid.shape), cmap="tab20")
+    ax.axis('off')
+    if filename is not None and len(filename) > 0:
+        fig.savefig(filename, format="svg", bbox_inches='tight', pad_inches=0)
+    else:
+        plt.show()
+    plt.close(fig)
+
+
+def init_render_worker(backend):
+    if backend is not None:
+        import matplotlib
+        matplotlib.use(backend)
+
+
+class RenderPool:
+    """ Renders solutions in background worker processes, so that the enumeration never waits
+    for matplotlib. At most max_pending renders are queued: when rendering falls behind,
+    submit() waits for the oldest one to finish. """
+
+    def __init__(self, processes: int = 1, to_files: bool = True, max_pending: int = None):
+        # Files are drawn without a display; otherwise, use matplotlib's default backend.
+        self.pool = Pool(processes, initializer=init_render_worker,
+                         initargs=("Agg" if to_files else None,))
+        self.max_pending = max_pending or MAX_PENDING_PER_WORKER * processes
+        self.pending = deque()
+        self.num_rendered = 0
+
+    def submit(self, solution, filename=None):
+        while len(self.pending) >= self.max_pending:
+            self._wait_oldest()
+        self.pending.append(self.pool.apply_async(render_grid, (solution.grid, filename)))
+
+    def _wait_oldest(self):
+        # get() re-raises any exception from the worker.
+        self.pending.popleft().get()
+        self.num_rendered += 1
+
+    def close(self):
+        """ Waits for every queued render and stops the workers. """
+        while self.pending:
+            self._wait_oldest()
+        self.pool.close()
+        self.pool.join()
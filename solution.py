@@ -1,66 +1,55 @@
-from matplotlib import pyplot as plt
-from termcolor import colored
+import numpy as np
 
-term_colors = ["red", "green", "yellow", "blue", "magenta", "cyan"]
+from render import colored, render_grid, term_colors
 
 
 class Solution:
     """ Represents a solution to a XOXO board. """
+    __slots__ = ("grid", "id", "_hash")
     _sol_num: int = 0
 
-    def __init__(self):
+    def __init__(self, width: int, height: int):
         """ Instantiate an empty solution. """
-        # A solution is represented by a dict of tuples (i, j) (coordinates) to ints (colors).
-        self.colors = {}
+        # A solution is represented by a height x width grid of ints (colors); -1 means unset.
+        self.grid = np.full((height, width), -1, dtype=np.int32)
         self.id = Solution._sol_num
-        self.height = None
-        self.width = None
+        self._hash = None
         Solution._sol_num += 1
 
+    @property
+    def height(self):
+        return self.grid.shape[0]
+
+    @property
+    def width(self):
+        return self.grid.shape[1]
+
     def add_color(self, i: int, j: int, color: int):
         """ Main function to build a solution. Set position (i, j) to color color."""
-        self.colors[(i, j)] = color
+        self.grid[i, j] = color
+        self._hash = None
 
-    def check_solution(self):
-        max_i = max(map(lambda c: c[0], self.colors.keys()))
-        max_j = max(map(lambda c: c[1], self.colors.keys()))
+    def has_color(self, i: int, j: int) -> bool:
+        return self.grid[i, j] >= 0
 
-        for i in range(max_i + 1):
-            for j in range(max_j + 1):
-                assert (i, j) in self.colors.keys()
-        self.height = max_i + 1
-        self.width = max_j + 1
+    def color(self, i: int, j: int) -> int:
+        return int(self.grid[i, j])
+
+    def check_solution(self):
+        assert (self.grid >= 0).all()
 
     def show(self, filename=None):
-        """ Show a solution using a matplotlib heatmap. """
+        """ Show a solution using a matplotlib heatmap, in this process. """
         self.check_solution()
-        data = []
-        plt.figure()
-        all_colors = set()
-        for color in self.colors.values():
-            all_colors.add(color)
-        colors_list = sorted(all_colors)
-        for i in range(self.height):
-            data_r = []
-            for j in range(self.width):
-                data_r.append(colors_list.index(self.colors[(i, j)]))
-            data.append(data_r)
-        plt.imshow(data, cmap="tab20")
-        plt.axis('off')
-
-        if filename is not None and len(filename) > 0:
-            plt.savefig(filename,
-                        format="svg", bbox_inches='tight', pad_inches=0)
-        else:
-            plt.show(bbox_inches='tight', pad_inches=0.15)
+        render_grid(self.grid, filename)
 
     def __str__(self):
         self.check_solution()
         ret = ''
         for i in range(self.height):
             for j in range(self.width):
-                k = self.colors[(i, j)]
-                s = colored(f"{str(k).rjust(len(str(len(self.colors) - 1)), '0')} ",
+                k = self.color(i, j)
+                s = colored(f"{str(k).rjust(len(str(self.grid.size - 1)), '0')} ",
                             term_colors[k % len(term_colors)])
                 ret += s + " "
             ret += '\n'
@@ -68,14 +57,12 @@ class Solution:
 
     def __repr__(self):
         self.check_solution()
-        return '\n'.join(map(lambda i: ''.join(
-            map(lambda j: str(self.colors[(i, j)]),
-                range(self.width))),
-                             range(self.height)))
+        return '\n'.join(map(lambda row: ''.join(map(str, row)), self.grid.tolist()))
 
     def __hash__(self):
-        self.check_solution()
-        return hash(repr(self))
+        if self._hash is None:
+            self._hash = hash((self.grid.shape, self.grid.tobytes()))
+        return self._hash
 
     def dump(self, filename=None):
         self.check_solution()
@@ -85,32 +72,41 @@ class Solution:
         else:
             print(repr(self))
 
-    def read(self, filename: str):
+    @staticmethod
+    def read(filename: str) -> "Solution":
         with open(filename, 'r') as f:
-            for i, line in enumerate(f.readlines()):
-                for j, col in enumerate(line.rstrip()):
-                    self.add_color(i, j, int(col))
-        self.check_solution()
+            lines = [line.rstrip() for line in f.readlines() if line.strip()]
+        solution = Solution(len(lines[0]), len(lines))
+        for i, line in enumerate(lines):
+            for j, col in enumerate(line):
+                solution.add_color(i, j, int(col))
+        solution.check_solution()
+        return solution
 
     def distance_to(self, other: "Solution") -> int:
-        count = 0
-        self.check_solution()
-        other.check_solution()
-        if self.width != other.width or self.height != other.height:
+        if self.grid.shape != other.grid.shape:
             raise ValueError("Solutions cannot be compared.")
-        for i in range(self.height):
-            for j in range(self.width):
-                if self.colors[(i, j)] != other.colors[(i, j)]:
-                    count += 1
-        return count
+        return int(np.count_nonzero(self.grid != other.grid))
 
     def __eq__(self, other: "Solution"):
-        self.check_solution()
-        other.check_solution()
-        if self.width != other.width or self.height != other.height:
+        if self.grid.shape != other.grid.shape:
             raise ValueError("Solutions cannot be compared.")
-        for i in range(self.height):
-            for j in range(self.width):
-                if self.colors[(i, j)] != other.colors[(i, j)]:
-                    return False
-        return True
+        return hash(self) == hash(other) and np.array_equal(self.grid, other.grid)
+
+
+def pairwise_distances(solutions, max_block_bytes: int = 1 << 26) -> np.ndarray:
+    """ Returns the matrix of distance_to() between every pair of solutions (all with the same
+    dimensions). Distances are computed in blocks of rows, to bound the memory used. """
+    solutions = list(solutions)
+    if not solutions:
+        return np.zeros((0, 0), dtype=np.int64)
+    if any(s.grid.shape != solutions[0].grid.shape for s in solutions):
+        raise ValueError("Solutions cannot be compared.")
+    grids = np.stack([s.grid.ravel() for s in solutions])
+    n, cells = grids.shape
+    block = max(1, max_block_bytes // (n * cells))
+    distances = np.empty((n, n), dtype=np.int64)
+    for start in range(0, n, block):
+        rows = grids[start:start + block]
+        distances[start:start + block] = (rows[:, None, :] != grids[None, :, :]).sum(axis=2)
+    return distances
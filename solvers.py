@@ -0,0 +1,323 @@
+import io
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+from array import array
+
+import instrument
+from utils import nice_time
+
+try:
+    from pysat.solvers import Solver as IpasirSolver
+except ImportError:
+    IpasirSolver = None
+
+solver_cmd = "cadical"
+# Solver commands raced by the portfolio solver when none are given.
+default_portfolio = ["cadical --seed=0", "cadical --seed=1", "cadical --seed=2",
+                     "kissat --seed=0", "kissat --seed=1"]
+
+
+class ModelParser:
+    """ Incremental parser of a solver's DIMACS output, fed with chunks of bytes as they are
+    read from the solver's pipe. It handles the 's' line (status) and the 'v' lines (values),
+    keeping only the positive literals up to max_var in a compact int array. """
+
+    def __init__(self, max_var: int = None):
+        self.max_var = max_var
+        self.status = None  # 1 for SATISFIABLE, 0 for UNSATISFIABLE
+        self.model = array('i')
+        self.found = False  # whether there were 'v' lines
+        self.complete = False  # whether the final 'v ... 0' was read
+        self._partial = b""
+
+    def feed(self, chunk: bytes):
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self.parse_line(line)
+
+    def close(self):
+        """ Parses the last line, if the output did not end with a newline. """
+        if self._partial:
+            self.parse_line(self._partial)
+            self._partial = b""
+
+    def parse_line(self, line: bytes):
+        if line[:2] in (b"v ", b"V "):
+            self.found = True
+            values = line.split()[1:]
+            if values and values[-1] == b"0":
+                self.complete = True
+                values.pop()
+            model, max_var = self.model, self.max_var
+            for value in values:
+                if value[0] != 45:  # '-'
+                    var = int(value)
+                    if max_var is None or var <= max_var:
+                        model.append(var)
+        elif line[:2] in (b"s ", b"S "):
+            if b"UNSATISFIABLE" in line:
+                self.status = 0
+            elif b"SATISFIABLE" in line:
+                self.status = 1
+
+    def result(self, rc: int):
+        """ 1 (SAT), 0 (UNSAT) or None, from the exit code or, failing that, the 's' line. """
+        return {10: 1, 20: 0}.get(rc, self.status)
+
+
+def get_model(lines, max_var: int = None):
+    """ Returns the array of DIMACS var ids that are true in the solver's output lines. """
+    parser = ModelParser(max_var)
+    for line in lines:
+        parser.parse_line(line.strip().encode())
+    return parser.model if parser.found else None
+
+
+def write_and_close(encoder, stream, units):
+    try:
+        instrument.count("bytes_piped", encoder.write_dimacs(stream, units))
+        stream.close()
+    except BrokenPipeError:
+        pass
+
+
+def send_to_solver(encoder, assumptions=(), verbose=True):
+    """ Stream the encoder's constraints in DIMACS to solver.
+    Assumptions are sent as unit clauses. """
+    if verbose:
+        print(f"# sending to solver '{solver_cmd}'...", end=' ')
+    start_time = time.time()
+    instrument.count("solver_calls")
+    with instrument.span("solver_process", solver=solver_cmd):
+        p = subprocess.Popen(solver_cmd, shell=True, stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        # Write from another thread, so that the solver never blocks on a full stdout pipe.
+        writer = threading.Thread(target=write_and_close, args=(encoder, p.stdin, assumptions))
+        writer.start()
+        # The output is decoded while the solver runs.
+        parser = ModelParser(encoder.num_base_vars)
+        for chunk in iter(lambda: p.stdout.read1(1 << 16), b""):
+            parser.feed(chunk)
+        parser.close()
+        writer.join()
+        p.wait()
+    if verbose:
+        print(f"took {nice_time(time.time() - start_time)}.")
+    return decode_result(solver_cmd, p.returncode, parser)
+
+
+def decode_result(cmd: str, rc: int, parser: ModelParser):
+    """ Returns (1, model) or (0, None) from a solver's exit code and parsed output. """
+    result = parser.result(rc)
+    if result == 1 and parser.complete:
+        return 1, parser.model
+    elif result == 0:
+        return 0, None
+    else:
+        raise ValueError(f"Something wrong with solver {cmd}.")
+
+
+async def feed_stdin(p, cnf: bytes):
+    try:
+        p.stdin.write(cnf)
+        await p.stdin.drain()
+        p.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+async def run_solver(cmd: str, cnf: bytes, max_var: int = None):
+    """ Runs one solver command on cnf, parsing its output while it runs.
+    If cancelled, the solver process is killed. """
+    import asyncio
+    p = await asyncio.create_subprocess_exec(*shlex.split(cmd), stdin=subprocess.PIPE,
+                                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    writer = asyncio.create_task(feed_stdin(p, cnf))
+    parser = ModelParser(max_var)
+    try:
+        while chunk := await p.stdout.read(1 << 16):
+            parser.feed(chunk)
+        parser.close()
+        await writer
+        await p.wait()
+    except asyncio.CancelledError:
+        writer.cancel()
+        if p.returncode is None:
+            p.kill()
+            await p.wait()
+        raise
+    return cmd, p.returncode, parser
+
+
+async def race_solvers(cmds, cnf: bytes, max_var: int = None):
+    """ Runs every command concurrently on cnf and returns (cmd, exit code, parsed output) of
+    the first one that answers SAT or UNSAT. All the others are cancelled. """
+    import asyncio
+    tasks = [asyncio.create_task(run_solver(cmd, cnf, max_var)) for cmd in cmds]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                cmd, rc, parser = await next_done
+            except OSError:
+                continue
+            if parser.result(rc) is not None:
+                return cmd, rc, parser
+        raise ValueError(f"No solver in the portfolio {cmds} answered.")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class Solver:
+    """ A SAT backend for the enumeration loop.
+    It reads the constraints of an encoder and returns (1, model) or (0, None) on solve(),
+    where model is the sequence of variables that are true. """
+
+    def __init__(self, encoder, verbose=True):
+        self.encoder = encoder
+        self.verbose = verbose
+
+    def solve(self, assumptions=()):
+        """ Solves the encoder's constraints, under the given assumptions (literals). """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SubprocessSolver(Solver):
+    """ Streams the whole CNF to a fresh solver process on every call. """
+
+    def solve(self, assumptions=()):
+        return send_to_solver(self.encoder, assumptions, self.verbose)
+
+
+class IncrementalSolver(Solver):
+    """ Keeps a single in-process (IPASIR-style) solver alive.
+    The base encoding is loaded once; afterwards, only the constraints added to the encoder
+    since the previous call (i.e., blocking clauses) are passed to the solver. """
+
+    def __init__(self, encoder, verbose=True, name="cadical153"):
+        super().__init__(encoder, verbose)
+        if IpasirSolver is None:
+            raise ImportError("Incremental solving requires the 'python-sat' package.")
+        self.name = name
+        self._solver = IpasirSolver(name=name)
+        self._num_loaded = 0
+
+    def load_new_constraints(self):
+        constraints = self.encoder.constraints
+        with instrument.span("load_clauses"):
+            for clause in constraints.clauses(self._num_loaded):
+                self._solver.add_clause(clause.tolist())
+        instrument.count("clauses_loaded", len(constraints) - self._num_loaded)
+        self._num_loaded = len(constraints)
+
+    def solve(self, assumptions=()):
+        if self.verbose:
+            print(f"# solving with '{self.name}' (incremental)...", end=' ')
+        start_time = time.time()
+        self.load_new_constraints()
+        instrument.count("solver_calls")
+        with instrument.span("incremental_solve"):
+            sat = self._solver.solve(assumptions=list(assumptions))
+        if self.verbose:
+            print(f"took {nice_time(time.time() - start_time)}.")
+        if not sat:
+            return 0, None
+        return 1, [lit for lit in self._solver.get_model() if lit > 0]
+
+    def close(self):
+        self._solver.delete()
+
+
+class PortfolioSolver(Solver):
+    """ Races several solver commands (different solvers or seeds) on the same CNF, on every
+    call, and keeps the first answer. Wins are counted per board in a JSON stats file; when
+    there are more installed commands than max_parallel, the ones that won most often on this
+    board in previous runs are launched. """
+
+    def __init__(self, encoder, verbose=True, commands=None, stats_file=None, max_parallel=None):
+        super().__init__(encoder, verbose)
+        commands = commands or default_portfolio
+        self.commands = [cmd for cmd in commands if shutil.which(shlex.split(cmd)[0])]
+        if not self.commands:
+            raise ValueError(f"None of the portfolio solvers {commands} is installed.")
+        self.stats_file = stats_file
+        self.board = f"{encoder.width}x{encoder.height}_{encoder.k}" \
+                     f"{'_u' if encoder.unique else ''}"
+        self.stats = {}
+        if stats_file is not None and os.path.exists(stats_file):
+            with open(stats_file) as f:
+                self.stats = json.load(f)
+        past_wins = self.stats.get(self.board, {})
+        self.commands.sort(key=lambda cmd: -past_wins.get(cmd, 0))
+        self.commands = self.commands[:max_parallel]
+        self.wins = {}
+
+    def solve(self, assumptions=()):
+        if self.verbose:
+            print(f"# racing {len(self.commands)} solvers...", end=' ')
+        start_time = time.time()
+        cnf = io.BytesIO()
+        with instrument.span("dimacs"):
+            self.encoder.write_dimacs(cnf, assumptions)
+        instrument.count("solver_calls")
+        instrument.count("bytes_piped", cnf.tell() * len(self.commands))
+        # asyncio is only imported by the portfolio, as it is slow to import.
+        import asyncio
+        with instrument.span("portfolio_race"):
+            cmd, rc, parser = asyncio.run(race_solvers(self.commands, cnf.getvalue(),
+                                                       self.encoder.num_base_vars))
+        self.wins[cmd] = self.wins.get(cmd, 0) + 1
+        if self.verbose:
+            print(f"took {nice_time(time.time() - start_time)}, '{cmd}' won.")
+        return decode_result(cmd, rc, parser)
+
+    def close(self):
+        """ Adds this run's wins to the stats file. """
+        if self.verbose:
+            for cmd, wins in sorted(self.wins.items(), key=lambda item: -item[1]):
+                print(f"# portfolio: '{cmd}' won {wins} times.")
+        if self.stats_file is None or not self.wins:
+            return
+        # Re-read the file, in case another run updated it in the meantime.
+        stats = {}
+        if os.path.exists(self.stats_file):
+            with open(self.stats_file) as f:
+                stats = json.load(f)
+        board_stats = stats.setdefault(self.board, {})
+        for cmd, wins in self.wins.items():
+            board_stats[cmd] = board_stats.get(cmd, 0) + wins
+        tmp_file = f"{self.stats_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(stats, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.stats_file)
+
+
+def portfolio_args(config) -> dict:
+    """ Extra arguments of make_solver() for the portfolio solver, from a Configurations. """
+    if config.solver != "portfolio":
+        return {}
+    return {"commands": config.portfolio, "stats_file": config.portfolio_stats,
+            "max_parallel": config.portfolio_size}
+
+
+def make_solver(kind: str, encoder, verbose=True, **portfolio_args) -> Solver:
+    """ Returns a solver backend of the given kind, falling back to a subprocess if needed.
+    portfolio_args are passed to PortfolioSolver. """
+    if kind == "portfolio":
+        return PortfolioSolver(encoder, verbose, **portfolio_args)
+    if kind == "incremental":
+        if IpasirSolver is not None:
+            return IncrementalSolver(encoder, verbose)
+        if verbose:
+            print("# python-sat is not installed. Falling back to a solver subprocess.")
+    return SubprocessSolver(encoder, verbose)
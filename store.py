@@ -0,0 +1,191 @@
+import hashlib
+import os
+import struct
+import sys
+from typing import Optional
+
+import numpy as np
+
+from polyomino import Polyomino
+from solution import Solution
+
+STORE_MAGIC = b"XOXOSOLS"
+STORE_VERSION = 1
+# magic, version, width, height, k, number of pieces
+HEADER = struct.Struct("<8sIIIII")
+
+
+def cell_dtype(num_pieces: int) -> np.dtype:
+    """ Each cell holds the index of its piece in the store's piece table. """
+    if num_pieces <= 1 << 8:
+        return np.dtype(np.uint8)
+    return np.dtype("<u2") if num_pieces <= 1 << 16 else np.dtype("<u4")
+
+
+def record_digest(record: bytes) -> bytes:
+    """ A hash of a packed solution that, unlike hash(), is the same in every process. """
+    return hashlib.blake2b(record, digest_size=8).digest()
+
+
+class SolutionStore:
+    """ Append-only binary file of solutions.
+    The file starts with a header (w, h, k and the piece table: the coordinates of every
+    polyomino, in the order of the solutions' colors), followed by fixed-size records of w * h
+    cells each. Records are read back through a memory map, and an index by hash of the record
+    finds duplicates and known solutions without reading the whole file. """
+
+    def __init__(self, filename: str, width: int = None, height: int = None, k: int = None,
+                 polyominoes=None, mode: str = "a"):
+        """ With mode 'a', opens filename to append solutions, or creates it if it does not
+        exist. The dimensions and polyominoes must be given to create a store; if given for an
+        existing one, they must match it. With mode 'r', the store is only read, and the file is
+        never written. """
+        if mode not in ("r", "a"):
+            raise ValueError(f"Unknown store mode {mode!r}.")
+        self.filename = filename
+        self.mode = mode
+        if mode == "r" or os.path.exists(filename) and os.path.getsize(filename) > 0:
+            self._read_header()
+            if width is not None and (width, height, k) != (self.width, self.height, self.k):
+                raise ValueError(f"Store {filename} has {self.width}x{self.height} boards with "
+                                 f"k={self.k}, not {width}x{height} with k={k}.")
+            if polyominoes is not None and list(polyominoes) != self.polyominoes:
+                raise ValueError(f"Store {filename} has a different piece table.")
+            self._file = open(filename, "rb" if mode == "r" else "r+b")
+        else:
+            if width is None or polyominoes is None:
+                raise ValueError(f"Store {filename} does not exist.")
+            self.width, self.height, self.k = width, height, k
+            self.polyominoes = list(polyominoes)
+            self._file = open(filename, "w+b")
+            self._write_header()
+        self.dtype = cell_dtype(len(self.polyominoes))
+        self.record_size = self.width * self.height * self.dtype.itemsize
+        size = self._file.seek(0, os.SEEK_END)
+        self.num_records = (size - self.data_offset) // self.record_size
+        if mode == "a":
+            # Drop a partial record, left by a crash while appending.
+            self._file.truncate(self.data_offset + self.num_records * self.record_size)
+        self._records = None
+        self._index = None
+
+    def _write_header(self):
+        table = np.array([poly.coords() for poly in self.polyominoes], dtype="<i2")
+        self._file.write(HEADER.pack(STORE_MAGIC, STORE_VERSION, self.width, self.height, self.k,
+                                     len(self.polyominoes)))
+        self._file.write(table.tobytes())
+        self.data_offset = self._file.tell()
+
+    def _read_header(self):
+        with open(self.filename, "rb") as f:
+            magic, version, self.width, self.height, self.k, num_pieces = \
+                HEADER.unpack(f.read(HEADER.size))
+            if magic != STORE_MAGIC:
+                raise ValueError(f"{self.filename} is not a solution store.")
+            if version != STORE_VERSION:
+                raise ValueError(f"Unsupported solution store version {version}.")
+            table = np.frombuffer(f.read(num_pieces * self.k * 2 * 2), dtype="<i2")
+            self.polyominoes = [Polyomino([tuple(c) for c in coords.tolist()])
+                                for coords in table.reshape(num_pieces, self.k, 2)]
+            self.data_offset = f.tell()
+
+    def __len__(self):
+        return self.num_records
+
+    def pack(self, solution: Solution) -> bytes:
+        if (solution.width, solution.height) != (self.width, self.height):
+            raise ValueError(f"Solution is {solution.width}x{solution.height}, not "
+                             f"{self.width}x{self.height}.")
+        solution.check_solution()
+        return solution.grid.astype(self.dtype).tobytes()
+
+    def append(self, solution: Solution) -> bool:
+        """ Appends a solution, unless it is already in the store. Returns whether it was. """
+        if self.mode == "r":
+            raise ValueError(f"Store {self.filename} is opened read-only.")
+        record = self.pack(solution)
+        if self._find_record(record) is not None:
+            return False
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(record)
+        self._index.setdefault(record_digest(record), []).append(self.num_records)
+        self.num_records += 1
+        return True
+
+    def flush(self):
+        self._file.flush()
+
+    def records(self) -> np.ndarray:
+        """ A read-only (#records, h, w) memory map of the stored solutions. """
+        if self._records is None or len(self._records) != self.num_records:
+            self.flush()
+            if self.num_records == 0:
+                return np.zeros((0, self.height, self.width), dtype=self.dtype)
+            self._records = np.memmap(self.filename, dtype=self.dtype, mode="r",
+                                      offset=self.data_offset,
+                                      shape=(self.num_records, self.height, self.width))
+        return self._records
+
+    def __getitem__(self, idx: int) -> Solution:
+        if idx < 0:
+            idx += self.num_records
+        if not 0 <= idx < self.num_records:
+            raise IndexError(idx)
+        solution = Solution(self.width, self.height)
+        solution.grid[:] = self.records()[idx]
+        return solution
+
+    def __iter__(self):
+        for idx in range(self.num_records):
+            yield self[idx]
+
+    def _build_index(self):
+        self._index = {}
+        records = self.records()
+        for idx in range(self.num_records):
+            self._index.setdefault(record_digest(records[idx].tobytes()), []).append(idx)
+
+    def _find_record(self, record: bytes) -> Optional[int]:
+        if self._index is None:
+            self._build_index()
+        candidates = self._index.get(record_digest(record), ())
+        if not candidates:
+            return None
+        records = self.records()
+        return next((idx for idx in candidates if records[idx].tobytes() == record), None)
+
+    def find(self, solution: Solution) -> Optional[int]:
+        """ Returns the index of solution in the store, or None. """
+        return self._find_record(self.pack(solution))
+
+    def __contains__(self, solution: Solution):
+        return self.find(solution) is not None
+
+    def export_text(self, filename: str = None):
+        """ Writes every solution in the text format of Solution.dump(), separated by blank
+        lines, to filename or to stdout. """
+        f = open(filename, "w") if filename else sys.stdout
+        try:
+            for solution in self:
+                f.write(repr(solution) + "\n\n")
+        finally:
+            if filename:
+                f.close()
+
+    def close(self):
+        self._records = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    # Usage: python store.py <store file> [<text file>]
+    with SolutionStore(sys.argv[1], mode="r") as store:
+        print(f"# {len(store)} solutions of {store.width}x{store.height} with "
+              f"{len(store.polyominoes)} polyominoes of size {store.k}.", file=sys.stderr)
+        store.export_text(sys.argv[2] if len(sys.argv) > 2 else None)
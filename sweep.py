@@ -0,0 +1,203 @@
+import argparse
+import math
+import os
+import sqlite3
+import time
+from multiprocessing import Pool
+
+import placements
+from cache import DEFAULT_CACHE_DIR, Cache
+from configurations import Configurations
+from counter import TilingCounter
+from dlx import DLXTiler
+from generator import fixed_polyominoes
+from placement_encoder import PlacementEncoder
+from solvers import make_solver, portfolio_args
+from store import SolutionStore
+from utils import nice_time
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS results (
+    width INTEGER, height INTEGER, k INTEGER, is_unique INTEGER, pieces TEXT, backend TEXT,
+    num_solutions INTEGER, elapsed REAL, store_file TEXT, finished_at REAL,
+    PRIMARY KEY (width, height, k, is_unique, pieces, backend))"""
+
+# The worker process' polyomino libraries ({k: polyominoes}), set up by init_worker().
+_libraries = None
+
+
+def parse_range(text: str) -> range:
+    """ Parses '5' or '3-8' (inclusive) as a range. """
+    first, _, last = text.partition('-')
+    return range(int(first), int(last or first) + 1)
+
+
+def estimated_cost(width: int, height: int, k: int, num_polyominoes: int) -> float:
+    """ Log of a rough bound on the search tree: num_polyominoes choices for each piece. """
+    return width * height / k * math.log(max(2, num_polyominoes))
+
+
+def init_worker(libraries, cache_dir, cache_size):
+    global _libraries
+    _libraries = libraries
+    if cache_dir is not None:
+        placements.placement_cache = Cache(cache_dir, cache_size)
+
+
+def enumerate_sat(config: Configurations, polyominoes, store):
+    encoder = PlacementEncoder(config, polyominoes)
+    encoder.encode()
+    solver = make_solver(config.solver, encoder, verbose=False, **portfolio_args(config))
+    num_models = 0
+    result, model = solver.solve()
+    while result == 1:
+        num_models += 1
+        if store is not None:
+            store.append(encoder.get_solution(model))
+        encoder.block_model(model)
+        result, model = solver.solve()
+    solver.close()
+    return num_models
+
+
+def run_configuration(config: Configurations, store_dir):
+    """ Solves one configuration. Returns (config, #solutions, elapsed, store file). """
+    start_time = time.time()
+    polyominoes = _libraries[config.k]
+    store_file, store = None, None
+    if store_dir is not None and config.backend != "count":
+        # The same fields as the results' primary key, so that sweeps never share a file.
+        store_file = os.path.join(store_dir, f"solutions_{config.width}x{config.height}_"
+                                             f"{config.k}{'_u' if config.unique else ''}_"
+                                             f"{config.pieces}_{config.backend}.sol")
+        if os.path.exists(store_file):
+            os.remove(store_file)
+        store = SolutionStore(store_file, config.width, config.height, config.k,
+                              sorted(polyominoes))
+    if config.backend == "count":
+        num_solutions = TilingCounter(config, polyominoes).count()
+    elif config.backend == "dlx":
+        num_solutions = 0
+        for solution in DLXTiler(config, polyominoes).solutions():
+            num_solutions += 1
+            if store is not None:
+                store.append(solution)
+    else:
+        num_solutions = enumerate_sat(config, polyominoes, store)
+    if store is not None:
+        store.close()
+    return config, num_solutions, time.time() - start_time, store_file
+
+
+def run_task(task):
+    return run_configuration(*task)
+
+
+def sweep(widths, heights, ks, unique=False, pieces="fixed", backend="dlx", jobs=1,
+          db_file="sweep.db", store_dir=None, use_cache=True, cache_dir=None,
+          cache_size=1024, solver="incremental", portfolio=None,
+          portfolio_stats="portfolio_stats.json", portfolio_size=None):
+    """ Solves every (w, h, k) configuration that is not in the results database yet. """
+    db = sqlite3.connect(db_file)
+    db.execute(SCHEMA)
+    done = {row for row in db.execute(
+        "SELECT width, height, k FROM results WHERE is_unique = ? AND pieces = ? AND backend = ?",
+        (int(unique), pieces, backend))}
+
+    configs = []
+    for k in ks:
+        for width in widths:
+            for height in heights:
+                if (width * height) % k != 0:
+                    print(f"# skipping {width}x{height} with k={k}: {width * height} cells "
+                          f"are not a multiple of {k}.")
+                elif (width, height, k) in done:
+                    print(f"# skipping {width}x{height} with k={k}: already in {db_file}.")
+                else:
+                    configs.append(Configurations(width, height, k, unique, False,
+                                                  solver=solver, backend=backend, pieces=pieces,
+                                                  render=False, portfolio=portfolio,
+                                                  portfolio_stats=portfolio_stats,
+                                                  portfolio_size=portfolio_size))
+    if not configs:
+        print("# Nothing to do.")
+        return
+
+    cache = None
+    if use_cache:
+        cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        cache = Cache(cache_dir, cache_size << 20)
+    print("# building polyomino libraries...", end=' ')
+    start_time = time.time()
+    libraries = {}
+    for k in sorted({config.k for config in configs}):
+        if cache is not None:
+            libraries[k], _ = cache.polyominoes(k, pieces, fixed_polyominoes)
+        else:
+            libraries[k] = sorted(fixed_polyominoes(k))
+    print(f"took {nice_time(time.time() - start_time)}.")
+
+    # The most expensive configurations first, so that no long run starts last.
+    configs.sort(key=lambda c: -estimated_cost(c.width, c.height, c.k, len(libraries[c.k])))
+    if store_dir is not None:
+        os.makedirs(store_dir, exist_ok=True)
+
+    print(f"# solving {len(configs)} configurations with {jobs} jobs.")
+    start_time = time.time()
+    tasks = [(config, store_dir) for config in configs]
+    with Pool(jobs, initializer=init_worker,
+              initargs=(libraries, cache_dir if use_cache else None, cache_size << 20)) as pool:
+        for config, num_solutions, elapsed, store_file in pool.imap_unordered(run_task, tasks):
+            print(f"# {config.width}x{config.height} k={config.k}: {num_solutions} solutions in "
+                  f"{nice_time(elapsed)}.")
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (config.width, config.height, config.k, int(unique), pieces, backend,
+                        num_solutions, elapsed, store_file, time.time()))
+            db.commit()
+    db.close()
+    print(f"# Sweep done in {nice_time(time.time() - start_time)}.")
+
+
+def read_cmd_args():
+    parser = argparse.ArgumentParser(description="Solves many board configurations, recording "
+                                                 "the results in a SQLite database.")
+    parser.add_argument('-W', '--widths', type=parse_range, required=True,
+                        help="Board widths, e.g. '6' or '3-10'.")
+    parser.add_argument('-H', '--heights', type=parse_range, required=True,
+                        help="Board heights, e.g. '6' or '3-10'.")
+    parser.add_argument('-k', type=parse_range, required=True,
+                        help="Polyomino sizes, e.g. '4' or '3-5'.")
+    parser.add_argument('-u', '--unique', action='store_true',
+                        help='Each polyomino can be used only once.')
+    parser.add_argument('-p', '--pieces', choices=['fixed', 'one-sided', 'free'], default='fixed',
+                        help="Which orientations are the same piece, as in main.py.")
+    parser.add_argument('-b', '--backend', choices=['dlx', 'sat', 'count'], default='dlx',
+                        help="'dlx' and 'sat' enumerate the solutions; 'count' only counts them.")
+    parser.add_argument('-s', '--solver', choices=['incremental', 'subprocess', 'portfolio'],
+                        default='incremental', help="SAT solver backend, as in main.py.")
+    parser.add_argument('--portfolio', nargs='+', default=None, metavar='CMD',
+                        help="Solver commands raced with --solver portfolio.")
+    parser.add_argument('--portfolio-size', type=int, default=None,
+                        help="Number of portfolio commands launched at once (default: all), "
+                             "picking those with most wins on the board first.")
+    parser.add_argument('--portfolio-stats', default='portfolio_stats.json',
+                        help="JSON file with the wins of each portfolio command per board. "
+                             "Commands that won before on a board are launched first.")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help="Number of configurations solved in parallel.")
+    parser.add_argument('--db', default='sweep.db', help="SQLite results database.")
+    parser.add_argument('--store-dir', default=None,
+                        help="Directory where the solutions of each configuration are stored.")
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                        help="Do not use the on-disk cache.")
+    parser.add_argument('--cache-dir', default=None,
+                        help=f"Cache directory (default: $XOXO_CACHE_DIR or {DEFAULT_CACHE_DIR}).")
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help="Maximum size of the cache, in MB.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = read_cmd_args()
+    sweep(args.widths, args.heights, args.k, args.unique, args.pieces, args.backend, args.jobs,
+          args.db, args.store_dir, args.use_cache, args.cache_dir, args.cache_size, args.solver,
+          args.portfolio, args.portfolio_stats, args.portfolio_size)
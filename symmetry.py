@@ -0,0 +1,92 @@
+from configurations import Configurations
+from encoder import neg
+from placements import placement_matrix
+
+
+def board_symmetries(width: int, height: int):
+    """ Returns the maps (i, j) -> (i', j') of the non-identity dihedral symmetries of the
+    board: 3 for a rectangle and 7 for a square. """
+    symmetries = [lambda i, j: (height - 1 - i, j),
+                  lambda i, j: (i, width - 1 - j),
+                  lambda i, j: (height - 1 - i, width - 1 - j)]
+    if width == height:
+        symmetries += [lambda i, j: (j, i),
+                       lambda i, j: (width - 1 - j, height - 1 - i),
+                       lambda i, j: (j, height - 1 - i),
+                       lambda i, j: (width - 1 - j, i)]
+    return symmetries
+
+
+class BoardSymmetries:
+    """ The board symmetries, as permutations of the legal placements (in the order of the
+    board's PlacementMatrix). Since the image of a placement is the placement of some orientation
+    of the same shape, pieces are mapped to pieces and the permutations preserve all
+    constraints. """
+
+    def __init__(self, config: Configurations, polyominoes):
+        self.polyominoes = sorted(polyominoes)
+        self.matrix = placement_matrix(self.polyominoes, config.width, config.height)
+        self.placements = self.matrix.placements()
+        index = {self.cells(q): q for q in range(len(self.placements))}
+        self.perms = []
+        for symmetry in board_symmetries(config.width, config.height):
+            perm = [index[frozenset(symmetry(*cell) for cell in self.cells(q))]
+                    for q in range(len(self.placements))]
+            self.perms.append(perm)
+
+    def cells(self, q: int):
+        return frozenset(self.matrix.cell_coords(q))
+
+    def group_size(self):
+        return len(self.perms) + 1
+
+    def is_canonical(self, placements) -> bool:
+        """ A solution (set of placement indices) is canonical if it is the lexicographic leader
+        of its orbit: for every symmetry, the first placement in which it differs from its image
+        is not in the solution. """
+        placements = set(placements)
+        for perm in self.perms:
+            image = {perm[q] for q in placements}
+            diff = placements.symmetric_difference(image)
+            if diff and min(diff) in placements:
+                return False
+        return True
+
+    def orbit_size(self, placements) -> int:
+        """ Number of distinct solutions that are symmetric to the given one. """
+        placements = frozenset(placements)
+        return len({placements} | {frozenset(perm[q] for q in placements) for perm in self.perms})
+
+    def literals(self, encoder):
+        """ The literal that is true iff each placement is used, in the given encoder. """
+        return [encoder.placement_literal(p, i, j) for p, i, j in self.placements]
+
+    def model_placements(self, encoder, model):
+        """ Returns the indices of the placements used in a model (list of true variables). """
+        true_vars = set(model)
+        return [q for q, lit in enumerate(self.literals(encoder)) if lit in true_vars]
+
+    def add_lex_leader(self, encoder):
+        """ Adds, for every symmetry, the constraint X <=lex sigma(X) over the placement
+        literals X, where false < true. e_q means that X and sigma(X) are equal before q. """
+        x = self.literals(encoder)
+        for perm in self.perms:
+            inverse = [0] * len(perm)
+            for q, q_image in enumerate(perm):
+                inverse[q_image] = q
+            positions = [q for q in range(len(x)) if inverse[q] != q]
+            if not positions:
+                continue
+            e = None
+            for idx, q in enumerate(positions):
+                y = x[inverse[q]]
+                prefix = [] if e is None else [neg(e)]
+                # x_q <= y_q, if equal so far
+                encoder.add_constraint(prefix + [neg(x[q]), y])
+                if idx == len(positions) - 1:
+                    break
+                next_e = encoder.new_aux_var()
+                # equal so far and x_q = y_q -> equal up to q
+                encoder.add_constraint(prefix + [neg(x[q]), next_e])
+                encoder.add_constraint(prefix + [y, next_e])
+                e = next_e
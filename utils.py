@@ -0,0 +1,17 @@
+def nice_time(total_seconds):
+    """ Prints a time in a nice, legible format. """
+    if total_seconds < 60:
+        return f'{round(total_seconds, 1)}s'
+    total_seconds = round(total_seconds)
+    mins, secs = divmod(total_seconds, 60)
+    hours, mins = divmod(mins, 60)
+    days, hours = divmod(hours, 24)
+    ret = ''
+    if days > 0:
+        ret += f'{days}d'
+    if hours > 0:
+        ret += f'{hours}h'
+    if mins > 0:
+        ret += f'{mins}m'
+    ret += f'{secs}s'
+    return ret